@@ -0,0 +1,292 @@
+# archive.py
+"""Extração incremental de PDFs de um zip ou tar recebido em streaming.
+
+O corpo da requisição chega em pedaços; ``ChunkReader`` os expõe como um
+arquivo bloqueante para uma thread extratora, que grava cada PDF assim que a
+entrada termina — o processamento do primeiro PDF começa antes do upload
+acabar.
+
+zip: lido pelos cabeçalhos locais (sem o diretório central, que fica no fim),
+aceitando stored/deflate e data descriptor em entradas deflate.
+tar: via ``tarfile`` em modo stream (``r|*``, inclusive .tar.gz/.bz2/.xz).
+
+``repack_zip`` faz o caminho inverso para zips já gerados: troca nomes de
+entradas copiando os dados comprimidos byte a byte (nada é recomprimido).
+"""
+import os, io, zlib, queue, struct
+from typing import Iterator
+
+ZIP_LOCAL = b"PK\x03\x04"
+ZIP_DESCRIPTOR = b"PK\x07\x08"
+ZIP_CENTRAL = b"PK\x01\x02"
+ZIP_END = b"PK\x05\x06"
+ZIP_UTF8 = 0x800
+COPY_CHUNK = 256 * 1024
+
+class ChunkReader(io.RawIOBase):
+    """Arquivo somente-leitura alimentado por outra thread (ou pelo event loop) via feed()."""
+
+    def __init__(self, maxsize: int = 64):
+        self._q: "queue.Queue[bytes | None]" = queue.Queue(maxsize)
+        self._buf = b""
+        self._eof = False
+        self.aborted = False
+
+    def readable(self) -> bool:
+        return True
+
+    def feed_nowait(self, chunk: bytes) -> bool:
+        """False se a fila está cheia (o chamador deve usar feed() fora do event loop)."""
+        if self.aborted:
+            return True  # leitor desistiu: descarta
+        try:
+            self._q.put_nowait(chunk)
+            return True
+        except queue.Full:
+            return False
+
+    def feed(self, chunk: bytes | None):
+        # Bloqueia com backpressure; None marca o fim do corpo
+        while not self.aborted:
+            try:
+                self._q.put(chunk, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def finish(self):
+        self.feed(None)
+
+    def abort(self):
+        """Chamado pelo leitor quando para de ler; libera quem está em feed()."""
+        self.aborted = True
+
+    def readinto(self, b) -> int:
+        while not self._buf and not self._eof:
+            chunk = self._q.get()
+            if chunk is None:
+                self._eof = True
+            else:
+                self._buf = chunk
+        n = min(len(b), len(self._buf))
+        b[:n] = self._buf[:n]
+        self._buf = self._buf[n:]
+        return n
+
+class _Pushback:
+    """Leitura exata com devolução de bytes lidos a mais (fim de um stream deflate)."""
+
+    def __init__(self, f):
+        self.f = f
+        self.pending = b""
+
+    def read(self, n: int) -> bytes:
+        out = self.pending[:n]
+        self.pending = self.pending[n:]
+        while len(out) < n:
+            chunk = self.f.read(n - len(out))
+            if not chunk:
+                break
+            out += chunk
+        return out
+
+    def read_exact(self, n: int) -> bytes:
+        data = self.read(n)
+        if len(data) != n:
+            raise ValueError("zip truncado")
+        return data
+
+    def unread(self, data: bytes):
+        self.pending = data + self.pending
+
+def _is_pdf_entry(name: str) -> bool:
+    base = os.path.basename(name)
+    return name.lower().endswith(".pdf") and not base.startswith(".") and "__MACOSX/" not in name
+
+def _zip64_sizes(extra: bytes, csize: int, usize: int):
+    i = 0
+    while i + 4 <= len(extra):
+        tag, size = struct.unpack_from("<HH", extra, i)
+        if tag == 0x0001:
+            vals = list(struct.unpack_from(f"<{size // 8}Q", extra, i + 4))
+            if usize == 0xFFFFFFFF and vals: usize = vals.pop(0)
+            if csize == 0xFFFFFFFF and vals: csize = vals.pop(0)
+            break
+        i += 4 + size
+    return csize, usize
+
+def _iter_zip(f, sink) -> Iterator[str]:
+    src = _Pushback(f)
+    while True:
+        sig = src.read(4)
+        if sig != ZIP_LOCAL:
+            return  # diretório central (ou fim): não há mais entradas
+        (_, flag, method, _, _, crc, csize, usize, nlen, xlen) = struct.unpack("<HHHHHIIIHH", src.read_exact(26))
+        name = src.read_exact(nlen).decode("utf-8" if flag & 0x800 else "cp437", errors="replace")
+        csize, usize = _zip64_sizes(src.read_exact(xlen), csize, usize)
+        if flag & 0x1:
+            raise ValueError(f"entrada criptografada não suportada: {name}")
+        if method not in (0, 8):
+            raise ValueError(f"compressão não suportada ({method}): {name}")
+        streamed = bool(flag & 0x8)
+        if streamed and method == 0:
+            raise ValueError(f"entrada stored com data descriptor não suportada: {name}")
+
+        wanted = _is_pdf_entry(name) and not name.endswith("/")
+        out = sink.open(name) if wanted else None
+        inflater = zlib.decompressobj(-15) if method == 8 else None
+        got_crc, remaining = 0, csize
+        try:
+            while True:
+                if streamed:
+                    chunk = src.read(COPY_CHUNK)
+                    if not chunk:
+                        raise ValueError("zip truncado")
+                else:
+                    if remaining <= 0:
+                        break
+                    chunk = src.read_exact(min(COPY_CHUNK, remaining))
+                    remaining -= len(chunk)
+                data = inflater.decompress(chunk) if inflater else chunk
+                got_crc = zlib.crc32(data, got_crc)
+                if out: out.write(data)
+                if inflater and inflater.eof:
+                    src.unread(inflater.unused_data)
+                    break
+            if streamed:
+                # Data descriptor: assinatura opcional, crc e tamanhos (32 ou 64 bits)
+                head = src.read_exact(4)
+                if head == ZIP_DESCRIPTOR:
+                    head = src.read_exact(4)
+                crc = struct.unpack("<I", head)[0]
+                tail = src.read(16)
+                skip = 8 if tail[8:12] in (ZIP_LOCAL, b"PK\x01\x02") or len(tail) < 16 else 16
+                src.unread(tail[skip:])
+            if got_crc != crc:
+                raise ValueError(f"CRC inválido: {name}")
+        except BaseException:
+            if out: sink.discard(out)
+            raise
+        if out:
+            yield sink.commit(out)
+
+def _iter_tar(f, sink) -> Iterator[str]:
+    import tarfile
+    with tarfile.open(fileobj=f, mode="r|*") as tf:
+        for member in tf:
+            if not member.isfile() or not _is_pdf_entry(member.name):
+                continue
+            src = tf.extractfile(member)
+            out = sink.open(member.name)
+            try:
+                while True:
+                    chunk = src.read(COPY_CHUNK)
+                    if not chunk:
+                        break
+                    out.write(chunk)
+            except BaseException:
+                sink.discard(out)
+                raise
+            yield sink.commit(out)
+
+class _Sink:
+    """Grava cada entrada num .part e só a expõe (rename atômico) quando completa."""
+
+    def __init__(self, dest_dir: str, name_fn):
+        self.dest_dir = dest_dir
+        self.name_fn = name_fn
+        self.used: set = set()
+
+    def open(self, entry_name: str):
+        base = self.name_fn(os.path.basename(entry_name))
+        stem, ext = os.path.splitext(base)
+        name, k = base, 2
+        while name.lower() in self.used:
+            name = f"{stem}_{k}{ext}"; k += 1
+        self.used.add(name.lower())
+        path = os.path.join(self.dest_dir, name)
+        return open(path + ".part", "wb")
+
+    def commit(self, out) -> str:
+        out.close()
+        path = out.name[:-len(".part")]
+        os.replace(out.name, path)
+        return path
+
+    def discard(self, out):
+        out.close()
+        try: os.remove(out.name)
+        except OSError: pass
+
+def extract_pdfs(f, dest_dir: str, name_fn=lambda n: n) -> Iterator[str]:
+    """Gera o caminho de cada PDF do arquivo à medida que a entrada termina de ser gravada.
+    O formato é detectado pelos primeiros bytes (PK → zip; senão tar, comprimido ou não)."""
+    src = _Pushback(f)
+    head = src.read(4)
+    src.unread(head)
+    sink = _Sink(dest_dir, name_fn)
+    if head == ZIP_LOCAL:
+        yield from _iter_zip(src, sink)
+    elif not head:
+        return
+    else:
+        import tarfile
+        try:
+            yield from _iter_tar(src, sink)
+        except tarfile.TarError as e:
+            raise ValueError(f"arquivo não é zip nem tar: {e}") from e
+
+def _copy_range(src, out, n: int):
+    while n > 0:
+        chunk = src.read(min(COPY_CHUNK, n))
+        if not chunk:
+            raise ValueError("zip truncado")
+        out.write(chunk)
+        n -= len(chunk)
+
+def repack_zip(src_path: str, dst_path: str, renames: dict) -> int:
+    """Copia as entradas de ``src_path`` para ``dst_path`` trocando os nomes em
+    ``renames`` (antigo → novo); devolve quantas foram renomeadas.
+
+    Só os cabeçalhos locais e o diretório central são reescritos: os dados
+    comprimidos passam direto, sem inflate/deflate. O data descriptor, se
+    houver, vira crc/tamanhos no próprio cabeçalho local. Zip64 não é
+    suportado (os zips de saída ficam bem abaixo de 4 GB).
+    """
+    import zipfile
+    with zipfile.ZipFile(src_path) as zf:
+        infos = zf.infolist()
+    renamed, central = 0, []
+    with open(src_path, "rb") as src, open(dst_path, "wb") as out:
+        for info in infos:
+            if max(info.header_offset, info.compress_size, info.file_size) >= 0xFFFFFFFF:
+                raise ValueError(f"zip64 não suportado: {info.filename}")
+            src.seek(info.header_offset)
+            head = src.read(30)
+            if head[:4] != ZIP_LOCAL:
+                raise ValueError(f"cabeçalho local inválido: {info.filename}")
+            nlen, xlen = struct.unpack_from("<HH", head, 26)
+            src.seek(nlen + xlen, 1)
+            name = renames.get(info.filename, info.filename)
+            renamed += name != info.filename
+            try:
+                raw_name, flag = name.encode("ascii"), info.flag_bits & ~(ZIP_UTF8 | 0x8)
+            except UnicodeEncodeError:
+                raw_name, flag = name.encode("utf-8"), (info.flag_bits | ZIP_UTF8) & ~0x8
+            offset = out.tell()
+            out.write(struct.pack("<4sHHH4sIIIHH", ZIP_LOCAL, info.extract_version, flag, info.compress_type,
+                                  head[10:14], info.CRC, info.compress_size, info.file_size, len(raw_name), 0))
+            out.write(raw_name)
+            _copy_range(src, out, info.compress_size)
+            central.append((info, raw_name, flag, head[10:14], offset))
+        cd_offset = out.tell()
+        for info, raw_name, flag, stamp, offset in central:
+            out.write(struct.pack("<4sBBHHH4sIIIHHHHHII", ZIP_CENTRAL, info.create_version, info.create_system,
+                                  info.extract_version, flag, info.compress_type, stamp, info.CRC,
+                                  info.compress_size, info.file_size, len(raw_name), 0, len(info.comment),
+                                  0, info.internal_attr, info.external_attr, offset))
+            out.write(raw_name)
+            out.write(info.comment)
+        cd_size = out.tell() - cd_offset
+        out.write(struct.pack("<4sHHHHIIH", ZIP_END, 0, 0, len(central), len(central), cd_size, cd_offset, 0))
+    return renamed
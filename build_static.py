@@ -0,0 +1,83 @@
+# build_static.py
+"""Gera os assets da interface em static/dist.
+
+A partir de ui/ (index.html, app.js e o CSS já compilado ui/app.css), grava
+arquivos com hash de conteúdo no nome, variantes pré-comprimidas (.gz e, se o
+módulo ``brotli`` estiver instalado, .br) e um manifest.json lido pelo servidor.
+
+Uso: python build_static.py [--css]
+  --css  recompila ui/app.css com o Tailwind antes (pip install tailwindcss-bin)
+"""
+import os, sys, json, gzip, hashlib, shutil, subprocess
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+UI_DIR = os.path.join(BASE_DIR, "ui")
+DIST_DIR = os.path.join(BASE_DIR, "static", "dist")
+MANIFEST = os.path.join(DIST_DIR, "manifest.json")
+
+# Arquivos versionados por hash (cache longo); o index.html é servido com revalidação
+HASHED = {"app.css": "text/css; charset=utf-8", "app.js": "text/javascript; charset=utf-8"}
+
+try:
+    import brotli
+except ImportError:  # brotli é opcional; sem ele servimos só gzip
+    brotli = None
+
+def compile_css():
+    subprocess.run(
+        ["tailwindcss", "-i", os.path.join(UI_DIR, "tailwind.css"), "-o", os.path.join(UI_DIR, "app.css"), "--minify"],
+        check=True,
+    )
+
+def _digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:12]
+
+def _write_variants(name: str, data: bytes) -> list:
+    with open(os.path.join(DIST_DIR, name), "wb") as f: f.write(data)
+    encodings = []
+    # mtime=0 deixa o .gz determinístico (mesmo conteúdo → mesmos bytes)
+    with open(os.path.join(DIST_DIR, name + ".gz"), "wb") as f:
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    encodings.append("gzip")
+    if brotli is not None:
+        with open(os.path.join(DIST_DIR, name + ".br"), "wb") as f:
+            f.write(brotli.compress(data, quality=11))
+        encodings.append("br")
+    return encodings
+
+def is_fresh() -> bool:
+    """True se o manifest existe e é mais novo que os fontes em ui/."""
+    if not os.path.exists(MANIFEST):
+        return False
+    built = os.path.getmtime(MANIFEST)
+    return all(os.path.getmtime(os.path.join(UI_DIR, src)) <= built for src in ("index.html", *HASHED))
+
+def build() -> dict:
+    shutil.rmtree(DIST_DIR, ignore_errors=True)
+    os.makedirs(DIST_DIR, exist_ok=True)
+    files = {}
+    with open(os.path.join(UI_DIR, "index.html"), encoding="utf-8") as f:
+        html = f.read()
+    for src, ctype in HASHED.items():
+        with open(os.path.join(UI_DIR, src), "rb") as f:
+            data = f.read()
+        stem, ext = os.path.splitext(src)
+        digest = _digest(data)
+        name = f"{stem}.{digest}{ext}"
+        files[name] = {"type": ctype, "etag": digest, "encodings": _write_variants(name, data), "immutable": True}
+        html = html.replace("{{" + src + "}}", f"/assets/{name}")
+    data = html.encode("utf-8")
+    files["index.html"] = {
+        "type": "text/html; charset=utf-8", "etag": _digest(data),
+        "encodings": _write_variants("index.html", data), "immutable": False,
+    }
+    manifest = {"files": files}
+    with open(MANIFEST, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+if __name__ == "__main__":
+    if "--css" in sys.argv[1:]:
+        compile_css()
+    for name, meta in build()["files"].items():
+        print(f"{name}  [{', '.join(meta['encodings'])}]")
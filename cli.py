@@ -0,0 +1,414 @@
+# cli.py
+"""Processamento em lote pela linha de comando, sem subir o servidor web.
+
+Uso:
+  python cli.py batch ENTRADA -o SAIDA [-j N] [--zip] [--report rel.json] [--no-compress]
+  python cli.py watch PASTA [-o SAIDA] [-j N] [--settle S] [--interval S] [--no-compress]
+
+ENTRADA é um PDF ou uma pasta (PDFs buscados recursivamente). As páginas saem
+em SAIDA/arquivos_processados/<pdf>/, como no servidor. Cada PDF concluído é
+registrado em SAIDA/.folha_manifest.json (com tamanho e mtime da entrada):
+rodando de novo, os já concluídos são pulados e os interrompidos, refeitos.
+Um PDF ilegível não derruba o lote: entra no relatório e no manifesto com
+"error" (e é tentado de novo na próxima execução), e o código de saída é 1.
+
+No modo watch, a pasta é vigiada (inotify no Linux, varredura periódica nos
+demais) e cada PDF novo vira um job do mesmo pipeline do servidor
+(process_normal_job), com saída em SAIDA/<pdf>/ — por padrão a pasta irmã
+"<PASTA>_processados". Arquivos ainda sendo copiados são ignorados até o
+tamanho e o mtime ficarem estáveis por --settle segundos; o índice
+SAIDA/.folha_manifest.json evita reprocessar após reinício. Só o nível
+superior da pasta é vigiado. Cada job roda no seu próprio processo: remover o
+PDF da pasta durante o processamento mata o job, e Ctrl-C/SIGTERM mata os que
+estiverem em andamento (refeitos na próxima subida).
+
+Reaproveita o motor do core.py (mesmo process_pdf_to_folder/make_zip) e não
+importa FastAPI, então sobe rápido.
+"""
+import os, sys, json, time, uuid, shutil, select, signal, argparse, multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+MANIFEST_NAME = ".folha_manifest.json"
+
+def find_pdfs(src: str) -> list:
+    if os.path.isfile(src):
+        return [os.path.abspath(src)]
+    found = []
+    for root, _, files in os.walk(src):
+        for fn in files:
+            if fn.lower().endswith(".pdf"):
+                found.append(os.path.abspath(os.path.join(root, fn)))
+    return sorted(found)
+
+def assign_out_dirs(pdfs: list, root: str) -> dict:
+    """Pasta de saída por entrada; nomes repetidos em subpastas diferentes ganham sufixo.
+    A ordem é determinística, então a mesma entrada cai na mesma pasta entre execuções."""
+    used, out = set(), {}
+    for p in pdfs:
+        base = os.path.splitext(os.path.basename(p))[0]
+        name, k = base, 2
+        while name.lower() in used:
+            name = f"{base}_{k}"; k += 1
+        used.add(name.lower())
+        out[p] = os.path.join(root, name)
+    return out
+
+def _fingerprint(path: str) -> dict:
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime": st.st_mtime}
+
+def load_manifest(path: str) -> dict:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {"files": {}}
+
+def save_manifest(path: str, manifest: dict):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+
+def _process_one(src: str, out_dir: str, compress: bool) -> dict:
+    # Executa no processo worker
+    import core
+    # O lote já roda um processo por arquivo: a gravação fica na própria thread
+    stats = core.process_pdf_to_folder(src, out_dir, "cli", compress, chunk=0)
+    return {**stats.to_dict(), "manual_pages": list(stats.manual_pages), "outputs": list(stats.outputs)}
+
+def _init_worker():
+    # Executa no processo worker: o pool de OCR criado aqui é encerrado junto com ele
+    import ocr
+    from multiprocessing.util import Finalize
+    Finalize(None, ocr.shutdown, exitpriority=10)
+
+def kill_pool(pool: ProcessPoolExecutor):
+    """Interrompe de fato: sem isso o with do pool esperaria cada worker terminar o PDF atual."""
+    for proc in list((getattr(pool, "_processes", None) or {}).values()):
+        proc.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+class Progress:
+    """Barra simples em stderr (uma linha por arquivo quando não é terminal)."""
+
+    def __init__(self, total: int):
+        self.total, self.done, self.pages = total, 0, 0
+        self.t0 = time.perf_counter()
+        self.tty = sys.stderr.isatty()
+
+    def update(self, name: str, pages: int):
+        self.done += 1
+        self.pages += pages
+        elapsed = max(time.perf_counter() - self.t0, 1e-6)
+        rate = self.pages / elapsed
+        eta = (self.total - self.done) * elapsed / self.done
+        if self.tty:
+            width = 24
+            filled = int(width * self.done / max(self.total, 1))
+            sys.stderr.write(
+                f"\r[{'#' * filled}{'-' * (width - filled)}] {self.done}/{self.total} arquivos"
+                f" · {self.pages} pág · {rate:.1f} pág/s · ETA {int(eta // 60):02d}:{int(eta % 60):02d}  "
+            )
+            if self.done == self.total: sys.stderr.write("\n")
+        else:
+            sys.stderr.write(f"{self.done}/{self.total} {name} ({pages} pág, {rate:.1f} pág/s)\n")
+        sys.stderr.flush()
+
+def run_batch(src: str, out: str, workers: int, compress: bool, make_zip: bool, report_path: str | None) -> dict:
+    import core
+    pdfs = find_pdfs(src)
+    root = os.path.join(out, "arquivos_processados")
+    os.makedirs(root, exist_ok=True)
+    manifest_path = os.path.join(out, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
+    out_dirs = assign_out_dirs(pdfs, root)
+
+    results, errors, pending = {}, {}, []
+    for p in pdfs:
+        done = manifest["files"].get(p)
+        if done and "error" not in done and done["input"] == _fingerprint(p) and os.path.isdir(out_dirs[p]):
+            results[p] = done["stats"]
+        else:
+            # Sobras de uma execução interrompida geram sufixos _k; recomeça o arquivo do zero
+            shutil.rmtree(out_dirs[p], ignore_errors=True)
+            pending.append(p)
+    skipped = len(results)
+
+    t0 = time.perf_counter()
+    progress = Progress(len(pending))
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            futures = {pool.submit(_process_one, p, out_dirs[p], compress): p for p in pending}
+            try:
+                for fut in as_completed(futures):
+                    p = futures[fut]
+                    try:
+                        stats = fut.result()
+                    except Exception as e:
+                        # Erro de um arquivo (PDF corrompido, sem permissão...): registra e segue
+                        errors[p] = f"{type(e).__name__}: {e}"
+                        shutil.rmtree(out_dirs[p], ignore_errors=True)
+                        manifest["files"][p] = {"input": _fingerprint(p), "out_dir": out_dirs[p], "error": errors[p]}
+                        save_manifest(manifest_path, manifest)
+                        progress.update(os.path.basename(p), 0)
+                        continue
+                    results[p] = stats
+                    manifest["files"][p] = {"input": _fingerprint(p), "out_dir": out_dirs[p], "stats": stats}
+                    save_manifest(manifest_path, manifest)
+                    progress.update(os.path.basename(p), stats["pages"])
+            except KeyboardInterrupt:
+                kill_pool(pool)
+                raise
+
+    zip_path = None
+    if make_zip and pdfs:
+        zip_path = os.path.join(out, core.generate_zip_filename([os.path.basename(p) for p in pdfs]))
+        core.make_zip(root, zip_path)
+
+    files = [{"input": p, **{k: v for k, v in results[p].items() if k != "outputs"}} for p in pdfs if p in results]
+    failed = [{"input": p, "error": errors[p]} for p in pdfs if p in errors]
+    report = {
+        "input": os.path.abspath(src), "output": os.path.abspath(out),
+        "elapsed": round(time.perf_counter() - t0, 2), "skipped": skipped, "zip": zip_path,
+        "totals": {
+            "files": len(files),
+            "pages": sum(f["pages"] for f in files),
+            "renamed": sum(f["renamed"] for f in files),
+            "manual": sum(f["manual"] for f in files),
+            "errors": len(failed),
+        },
+        "files": files + failed,
+    }
+    if report_path:
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return report
+
+# ==== Watch-folder ====
+class DirWatcher:
+    """Espera mudanças na pasta: inotify via ctypes quando disponível, senão só timeout."""
+    IN_CLOSE_WRITE, IN_MOVED_TO, IN_CREATE = 0x08, 0x80, 0x100
+
+    def __init__(self, path: str):
+        self.fd = None
+        try:
+            import ctypes, ctypes.util
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if fd >= 0 and libc.inotify_add_watch(fd, os.fsencode(path), self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_CREATE) >= 0:
+                self.fd = fd
+            elif fd >= 0:
+                os.close(fd)
+        except (OSError, AttributeError):
+            self.fd = None
+
+    @property
+    def mode(self) -> str:
+        return "inotify" if self.fd is not None else "polling"
+
+    def wait(self, timeout: float) -> bool:
+        """True se houve evento antes do timeout (no modo polling, sempre False)."""
+        if self.fd is None:
+            time.sleep(timeout)
+            return False
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return False
+        try:
+            while os.read(self.fd, 64 * 1024):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+def _run_watch_job(src: str, out_dir: str, compress: bool) -> dict:
+    # Executa no processo worker: mesmo pipeline de job do servidor
+    import core
+    job_id = "watch-" + uuid.uuid4().hex[:12]
+    core.JOBS[job_id] = {"dir": out_dir, "in": [src], "out": out_dir, "compress_mode": compress, "status": "queued"}
+    core.process_normal_job(job_id)
+    job = core.JOBS.pop(job_id)
+    stats = job.get("stats")
+    return {
+        "status": job.get("status"), "error": job.get("error"),
+        "summary": stats.summary() if stats else None,
+        "artifacts": job.get("artifacts", {}),
+    }
+
+def _watch_worker(src: str, out_dir: str, compress: bool, conn):
+    import ocr, core
+    try:
+        result = _run_watch_job(src, out_dir, compress)
+    except Exception as e:
+        result = {"status": "error", "error": str(e)}
+    finally:
+        ocr.shutdown()
+        core.shutdown_exec_pool()
+    conn.send(result)
+    conn.close()
+
+def scan_pdfs(folder: str) -> dict:
+    found = {}
+    with os.scandir(folder) as it:
+        for entry in it:
+            if entry.is_file() and entry.name.lower().endswith(".pdf") and not entry.name.startswith("."):
+                st = entry.stat()
+                found[os.path.abspath(entry.path)] = (st.st_size, st.st_mtime)
+    return found
+
+def run_watch(folder: str, out: str | None, workers: int, compress: bool, settle: float, interval: float):
+    folder = os.path.abspath(folder)
+    out = os.path.abspath(out or folder.rstrip(os.sep) + "_processados")
+    os.makedirs(out, exist_ok=True)
+    manifest_path = os.path.join(out, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
+    watcher = DirWatcher(folder)
+    print(f"vigiando {folder} ({watcher.mode}) → {out}", file=sys.stderr)
+
+    seen: dict = {}      # caminho → (tamanho, mtime, desde quando está estável)
+    used_dirs = {os.path.basename(v["out_dir"]).lower() for v in manifest["files"].values()}
+
+    def out_dir_for(p: str) -> str:
+        base = os.path.splitext(os.path.basename(p))[0]
+        name, k = base, 2
+        while name.lower() in used_dirs:
+            name = f"{base}_{k}"; k += 1
+        used_dirs.add(name.lower())
+        return os.path.join(out, name)
+
+    # Um processo por job (não um pool): dá para matar só aquele job
+    ctx = multiprocessing.get_context("spawn")
+    running: dict = {}   # caminho → (processo, pipe, pasta de saída, tamanho/mtime assentados)
+
+    def stop(p: str):
+        proc, conn, target, _ = running.pop(p)
+        proc.terminate()
+        proc.join()
+        conn.close()
+        shutil.rmtree(target, ignore_errors=True)
+
+    try:
+        while True:
+            now = time.monotonic()
+            found = scan_pdfs(folder)
+            for p in [p for p in running if p not in found]:
+                # PDF removido da pasta durante o processamento: cancela o job
+                stop(p)
+                print(f"cancelado: {os.path.basename(p)} (removido)", file=sys.stderr)
+            for p in [p for p in seen if p not in found]:
+                del seen[p]  # removido antes de assentar
+            for p, (size, mtime) in found.items():
+                done = manifest["files"].get(p)
+                if done and done["input"] == {"size": size, "mtime": mtime}:
+                    continue
+                prev = seen.get(p)
+                if prev is None or prev[:2] != (size, mtime):
+                    seen[p] = (size, mtime, now)  # mudou: reinicia o debounce
+                elif now - prev[2] >= settle and p not in running and size > 0:
+                    if len(running) >= workers:
+                        continue  # concorrência limitada: fica para a próxima volta
+                    # O índice guarda o tamanho/mtime que assentou, conferido de novo aqui:
+                    # se o arquivo mexeu desde a varredura, o debounce recomeça
+                    try:
+                        fp = _fingerprint(p)
+                    except FileNotFoundError:
+                        del seen[p]
+                        continue
+                    if (fp["size"], fp["mtime"]) != (size, mtime):
+                        seen[p] = (fp["size"], fp["mtime"], now)
+                        continue
+                    # Reprocessamento (arquivo mudou) reaproveita a mesma pasta
+                    target = done["out_dir"] if done else out_dir_for(p)
+                    shutil.rmtree(target, ignore_errors=True)
+                    recv, send = ctx.Pipe(duplex=False)
+                    proc = ctx.Process(target=_watch_worker, args=(p, target, compress, send), daemon=True)
+                    proc.start()
+                    send.close()
+                    running[p] = (proc, recv, target, fp)
+                    del seen[p]
+                    print(f"processando {os.path.basename(p)}", file=sys.stderr)
+
+            for p, (proc, conn, target, fp) in list(running.items()):
+                if conn.poll():
+                    try:
+                        result = conn.recv()
+                    except EOFError:
+                        result = None
+                elif proc.is_alive():
+                    continue
+                else:
+                    result = None
+                running.pop(p)
+                proc.join()
+                conn.close()
+                if result is None:
+                    result = {"status": "error", "error": f"worker encerrado (código {proc.exitcode})"}
+                if not os.path.exists(p):
+                    continue  # removido durante o processamento
+                # Erros também entram no índice: só reprocessa se o arquivo mudar (em
+                # relação ao início do job, então uma mudança durante o job é refeita)
+                manifest["files"][p] = {"input": fp, "out_dir": target, "result": result}
+                save_manifest(manifest_path, manifest)
+                print(f"{result['status']}: {os.path.basename(p)}" + (f" ({result['error']})" if result.get("error") else ""), file=sys.stderr)
+
+            # Com arquivos assentando ou jobs rodando, acorda mais cedo para conferir
+            timeout = interval
+            if seen: timeout = min(timeout, settle)
+            if running: timeout = min(timeout, 0.5)
+            watcher.wait(timeout)
+    except KeyboardInterrupt:
+        # Jobs em andamento são mortos; como não entraram no índice, são refeitos na próxima subida
+        for p in list(running):
+            stop(p)
+    finally:
+        watcher.close()
+
+def main(argv=None) -> int:
+    import ocr
+    try:
+        return _main(argv)
+    finally:
+        ocr.shutdown()
+
+def _main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="cli.py", description="Folha Ponto sem o servidor web")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("batch", help="desmembra e renomeia todos os PDFs de uma pasta")
+    b.add_argument("input", help="PDF ou pasta com PDFs")
+    b.add_argument("-o", "--output", required=True, help="pasta de saída")
+    b.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1, help="processos em paralelo")
+    b.add_argument("--zip", action="store_true", help="gera o zip final, como no servidor")
+    b.add_argument("--report", help="grava o relatório JSON neste caminho")
+    b.add_argument("--no-compress", action="store_true", help="não recomprime as páginas geradas")
+    w = sub.add_parser("watch", help="vigia uma pasta e processa cada PDF que chegar")
+    w.add_argument("input", help="pasta vigiada")
+    w.add_argument("-o", "--output", help="pasta de saída (padrão: <pasta>_processados)")
+    w.add_argument("-j", "--workers", type=int, default=2, help="jobs em paralelo")
+    w.add_argument("--settle", type=float, default=2.0, help="segundos sem mudança até o arquivo ser considerado completo")
+    w.add_argument("--interval", type=float, default=5.0, help="intervalo da varredura (fallback sem inotify)")
+    w.add_argument("--no-compress", action="store_true", help="não recomprime as páginas geradas")
+    args = parser.parse_args(argv)
+
+    if args.cmd == "batch":
+        report = run_batch(args.input, args.output, max(1, args.workers), not args.no_compress, args.zip, args.report)
+        t = report["totals"]
+        print(f"{t['files']} arquivos ({report['skipped']} já processados) · {t['pages']} páginas · "
+              f"{t['renamed']} renomeadas · {t['manual']} manuais · {report['elapsed']}s")
+        for f in report["files"]:
+            if "error" in f: print(f"erro: {f['input']}: {f['error']}", file=sys.stderr)
+        if report["zip"]: print(report["zip"])
+        if t["errors"]: return 1
+    elif args.cmd == "watch":
+        # SIGTERM (systemd/docker stop) encerra como Ctrl-C, matando os jobs em andamento
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        run_watch(args.input, args.output, max(1, args.workers), not args.no_compress, args.settle, args.interval)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+# controller.py
+"""Controle adaptativo de concorrência por memória e CPU.
+
+A instância roda com limite rígido de memória (512 MB no Render). A cada
+CTRL_INTERVAL segundos o servidor mede o RSS do processo (mais os filhos, como
+o pool de OCR) e a CPU com psutil, e decide os limites do escalonador:
+
+  - RSS acima de CTRL_CRITICAL do limite: 1 página e 1 job, antes do OOM;
+  - acima de CTRL_HIGH: corta as vagas de página pela metade e tira 1 job;
+  - abaixo de CTRL_LOW, com CPU sobrando e fila esperando: +1 vaga (e +1 job
+    se há jobs na fila), até os tetos.
+
+Aumento aditivo e corte multiplicativo, com uma pausa depois de cada corte
+para a memória assentar. As decisões viram eventos ``capacity`` nos jobs em
+andamento e ficam no histórico de /api/metrics.
+"""
+import os, time
+from collections import deque
+
+MEM_LIMIT_MB = float(os.environ.get("MEM_LIMIT_MB", "512"))
+CTRL_INTERVAL = float(os.environ.get("CTRL_INTERVAL", "1.0"))
+CTRL_LOW = float(os.environ.get("CTRL_LOW", "0.60"))
+CTRL_HIGH = float(os.environ.get("CTRL_HIGH", "0.80"))
+CTRL_CRITICAL = float(os.environ.get("CTRL_CRITICAL", "0.90"))
+CTRL_CPU_TARGET = float(os.environ.get("CTRL_CPU_TARGET", "85"))
+CTRL_MAX_SLOTS = int(os.environ.get("CTRL_MAX_SLOTS", "0")) or 2 * (os.cpu_count() or 1)
+CTRL_MAX_JOBS = int(os.environ.get("CTRL_MAX_JOBS", "8"))
+CTRL_COOLDOWN = 3  # amostras sem aumentar depois de um corte
+HISTORY = 50
+
+class ResourceSampler:
+    """RSS (MB, processo + filhos) e CPU (% da máquina) desde a amostra anterior."""
+
+    def __init__(self):
+        import psutil
+        self._psutil = psutil
+        self.proc = psutil.Process(os.getpid())
+        self.proc.cpu_percent(None)  # primeira leitura só arma o contador
+        self.cpus = psutil.cpu_count() or 1
+
+    def sample(self) -> tuple:
+        rss = self.proc.memory_info().rss
+        for child in self.proc.children(recursive=True):
+            try:
+                rss += child.memory_info().rss
+            except self._psutil.Error:
+                pass
+        cpu = self.proc.cpu_percent(None) / self.cpus
+        return rss / 1024 / 1024, cpu
+
+class ConcurrencyController:
+    def __init__(self, limit_mb: float = MEM_LIMIT_MB, max_slots: int = CTRL_MAX_SLOTS, max_jobs: int = CTRL_MAX_JOBS):
+        self.limit_mb = limit_mb
+        self.max_slots = max(1, max_slots)
+        self.max_jobs = max(1, max_jobs)
+        self.cooldown = 0
+        self.last = {"rss_mb": 0.0, "cpu": 0.0}
+        self.peak_rss_mb = 0.0
+        self.history: deque = deque(maxlen=HISTORY)
+
+    def decide(self, rss_mb: float, cpu: float, demand: dict) -> dict | None:
+        """Novos limites {"slots", "jobs", "reason"} ou None se nada muda.
+        ``demand`` vem de FairScheduler.demand()."""
+        self.last = {"rss_mb": round(rss_mb, 1), "cpu": round(cpu, 1)}
+        self.peak_rss_mb = max(self.peak_rss_mb, rss_mb)
+        slots, jobs = demand["slots"], demand["jobs"] or self.max_jobs
+        usage = rss_mb / self.limit_mb
+        if usage >= CTRL_CRITICAL:
+            new_slots, new_jobs, reason = 1, 1, "memória crítica"
+            self.cooldown = CTRL_COOLDOWN
+        elif usage >= CTRL_HIGH:
+            new_slots, new_jobs, reason = max(1, slots // 2), max(1, jobs - 1), "memória alta"
+            self.cooldown = CTRL_COOLDOWN
+        elif self.cooldown > 0:
+            self.cooldown -= 1
+            return None
+        elif usage < CTRL_LOW and cpu < CTRL_CPU_TARGET:
+            new_slots = slots + 1 if demand["waiting_pages"] and slots < self.max_slots else slots
+            new_jobs = jobs + 1 if demand["waiting_jobs"] and jobs < self.max_jobs else jobs
+            reason = "folga"
+        else:
+            return None
+        if (new_slots, new_jobs) == (slots, jobs):
+            return None
+        decision = {
+            "slots": new_slots, "jobs": new_jobs, "reason": reason,
+            "rss_mb": round(rss_mb, 1), "cpu": round(cpu, 1), "at": round(time.time(), 3),
+        }
+        self.history.append(decision)
+        return decision
+
+    def snapshot(self) -> dict:
+        return {
+            "limit_mb": self.limit_mb, "peak_rss_mb": round(self.peak_rss_mb, 1), **self.last,
+            "max_slots": self.max_slots, "max_jobs": self.max_jobs,
+            "decisions": list(self.history),
+        }
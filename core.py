@@ -0,0 +1,1278 @@
+# core.py
+"""Motor de desmembramento e renomeação, independente do servidor web.
+
+Usado pelo server.py (FastAPI) e pelo cli.py. Não importa FastAPI/anyio: os
+eventos de progresso saem por um "sink" registrado com set_event_sink.
+
+O PyMuPDF (fitz) e o zipfile só são importados no primeiro uso, para que a
+subida do servidor não pague esse custo (ver medir_import.py).
+"""
+import os, re, time, asyncio, shutil, mmap, hashlib, threading
+from collections import OrderedDict, deque
+from urllib.parse import quote
+from array import array
+from contextlib import contextmanager
+from itertools import islice
+from typing import Callable, List, Dict, Any
+import ocr
+from roster import RosterIndex
+from layouts import load_registry, PatternMatcher
+
+# ==== Config ====
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+DATA_DIR = os.path.join(BASE_DIR, "data")
+LAYOUTS_PATH = os.environ.get("LAYOUTS_PATH", os.path.join(BASE_DIR, "layouts.json"))
+# Processos do estágio de gravação do modo plano (PyMuPDF não paraleliza em threads)
+EXEC_WORKERS = int(os.environ.get("EXEC_WORKERS", "0")) or min(4, os.cpu_count() or 1)
+EXEC_CHUNK = 16  # páginas por tarefa enviada a um processo
+# Modo direto: páginas por bloco de gravação (0 = grava na própria thread do job)
+WRITE_CHUNK = int(os.environ.get("WRITE_CHUNK", "4"))
+JOB_CHUNKS = int(os.environ.get("JOB_CHUNKS", "2"))  # blocos de gravação no ar por job
+PREVIEW_CHUNK = 32  # mínimo de páginas por tarefa da prévia
+PREVIEW_CACHE = int(os.environ.get("PREVIEW_CACHE", "64"))  # PDFs com nomes guardados
+DOC_CACHE_OPEN = int(os.environ.get("DOC_CACHE_OPEN", "2"))  # PDFs de entrada abertos por job
+
+STOPWORDS = {"CARGO","ENDERECO","ATIVIDADE","EMPREGADOR","CIDADE","RUA","ASSINATURA","CTPS","CNPS","CNPJ","CGC"}
+NAME_PATTERNS = [
+    r'LOCALIZAÇÃO:\s*\d+\s+([A-ZÀ-Ý ]{5,}?)(?=\s+(?:\d{5,}|CTPS:|MENSALISTA|CATEGORIA:|HORÁRIOS:))',
+    r'EMPREGADO:\s*\d+\s+([A-ZÀ-Ý ]{5,}?)(?=\s+(?:CARGO:|LOCALIZAÇÃO:|CTPS:|CATEGORIA:))',
+    r'EMPREGADO:\s*([A-ZÀ-Ý ]{5,})',
+]
+ZERADO_PATTERNS = [
+    r'CADASTRO:\s*\d+\s+([A-ZÀ-Ý ]{5,}?)(?=\s+CNPJ)',
+]
+# Layouts embutidos; layouts.json (ou LAYOUTS_PATH) acrescenta/substitui por nome
+DEFAULT_LAYOUTS = [
+    {"name": "cartao_ponto", "fingerprint": [r'CART[ÃA]O PONTO', r'EMPREGADO:'], "patterns": NAME_PATTERNS},
+    {"name": "ponto_zerado", "fingerprint": [r'CADASTRO:\s*\d+', r'CNPJ'], "patterns": ZERADO_PATTERNS, "raw_fallback": True},
+]
+
+LAYOUTS = load_registry(DEFAULT_LAYOUTS, LAYOUTS_PATH)
+
+JOBS: Dict[str, Dict[str, Any]] = {}
+
+# ==== Utils ====
+def clean_text(txt: str) -> str:
+    txt = txt.replace('-\n', ' ')
+    return re.sub(r'\s+', ' ', txt).strip().upper()
+
+def sanitize_name_tokens(name: str) -> str | None:
+    if not name: return None
+    filtered = re.sub(r'[^A-ZÀ-Ý ]', ' ', name)
+    # Permitir palavras com 2+ letras (incluindo DE, DA, DO, etc.)
+    tokens = [t for t in filtered.split() if len(t) >= 2 and t not in STOPWORDS]
+    if len(tokens) < 2: return None
+    return ' '.join(tokens[:6])
+
+def sanitize_filename(s: str) -> str:
+    s = re.sub(r'[\\/:*?"<>|]', ' ', s)
+    s = re.sub(r'\s+', ' ', s).strip()
+    return s if s else "ARQUIVO"
+
+def corrected_name(raw) -> str | None:
+    """Nome vindo de uma correção manual, limpo; None se só há espaços ou caracteres
+    proibidos (sanitize_filename trocaria por ARQUIVO)."""
+    raw = str(raw or "")
+    return sanitize_filename(raw) if re.sub(r'[\\/:*?"<>|\s]', '', raw) else None
+
+def generate_zip_filename(filenames: List[str]) -> str:
+    # Se muitos arquivos, usar nome genérico curto
+    if len(filenames) > 5:
+        return "projetos_renomeados.zip"
+    codes = set()
+    for name in filenames:
+        name_upper = os.path.splitext(os.path.basename(name))[0].upper()
+        found_codes = re.findall(r'\b(\d{3,})\b', name_upper)
+        codes.update(found_codes)
+    if not codes:
+        return "documentos_desmembrados.zip"
+    sorted_codes = sorted(list(codes), key=int)
+    base = "_&_".join(sorted_codes)
+    return (base if len(base) < 60 else base[:57] + '...') + ".zip"
+
+# ==== Eventos ====
+_EVENT_SINK: Callable[[str, str, dict], None] | None = None
+
+def set_event_sink(sink: Callable[[str, str, dict], None] | None):
+    """Registra quem recebe os eventos dos workers (WebSocket no servidor, barra de progresso no CLI)."""
+    global _EVENT_SINK
+    _EVENT_SINK = sink
+
+def emit_from_worker(job_id: str, event: str, payload: dict):
+    sink = _EVENT_SINK
+    if sink is None:
+        return
+    try: sink(job_id, event, payload)
+    except Exception: pass
+
+# ==== Vez de página ====
+# Servidor registra uma função job_id -> objeto com turn(cancelled)/pause() (ver
+# scheduler.PageTurns); sem ela (CLI) as páginas seguem direto.
+_PAGE_GATE: Callable[[str], Any] | None = None
+
+def set_page_gate(gate: Callable[[str], Any] | None):
+    global _PAGE_GATE
+    _PAGE_GATE = gate
+
+def page_turns(job_id: str):
+    return _PAGE_GATE(job_id) if _PAGE_GATE is not None else None
+
+@contextmanager
+def paused_after(turns):
+    # Devolve a vaga ao sair do arquivo: não a segura entre um PDF e o próximo
+    try:
+        yield
+    finally:
+        if turns is not None: turns.pause()
+
+# ==== Cancelamento ====
+class JobCancelled(Exception):
+    pass
+
+def cancel_requested(job_id: str) -> bool:
+    job = JOBS.get(job_id)
+    return bool(job and job.get("cancel"))
+
+def cancel_token(job_id: str) -> Callable[[], bool]:
+    """Função sem argumentos repassada aos estágios (OCR, zip) para consultarem o cancelamento."""
+    return lambda: cancel_requested(job_id)
+
+# ==== Cache de documentos por job ====
+class JobDocCache:
+    """Abre cada PDF de entrada uma única vez por job e compartilha o handle.
+
+    O arquivo é mapeado em memória (mmap) e entregue ao PyMuPDF como
+    ``memoryview``, evitando copiar o conteúdo para o heap do Python. Como o
+    PyMuPDF não é thread-safe, cada documento tem seu próprio lock: sondagem de
+    metadados, métrica e desmembramento usam o mesmo handle, um por vez.
+
+    Só ``limit`` PDFs ficam abertos ao mesmo tempo — os primeiros a chegar, que
+    são os próximos da fila; os demais abrem e fecham a cada uso até vagar um
+    lugar. Cada PDF é liberado (release) assim que o desmembramento dele termina.
+    """
+
+    def __init__(self, limit: int = DOC_CACHE_OPEN):
+        self.limit = max(1, limit)
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._closed = False
+
+    @staticmethod
+    def _open(key: str) -> Dict[str, Any]:
+        import fitz  # PyMuPDF, sob demanda
+        fh = open(key, "rb")
+        try:
+            mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+            view = memoryview(mm)
+            doc = fitz.open(stream=view, filetype="pdf")
+        except Exception:
+            fh.close()
+            raise
+        return {"doc": doc, "view": view, "mmap": mm, "file": fh, "lock": threading.RLock(), "closed": False}
+
+    @staticmethod
+    def _close(entry: Dict[str, Any]):
+        # Chamado com o lock do documento. Ordem importa: o documento solta o buffer antes do mmap fechar
+        entry["closed"] = True
+        try: entry["doc"].close()
+        except Exception: pass
+        try: entry["view"].release()
+        except Exception: pass
+        try: entry["mmap"].close()
+        except Exception: pass
+        entry["file"].close()
+
+    @contextmanager
+    def use(self, path: str):
+        key = os.path.abspath(path)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("cache de documentos já liberado")
+            entry, own = self._entries.get(key), False
+            if entry is None:
+                entry, own = self._open(key), len(self._entries) >= self.limit
+                if not own:
+                    self._entries[key] = entry
+        with entry["lock"]:
+            if entry["closed"]:
+                entry, own = self._open(key), True  # liberado enquanto esperava a vez
+            try:
+                yield entry["doc"]
+            finally:
+                if own: self._close(entry)
+
+    def release(self, path: str):
+        """Fecha o handle de um PDF que não vai mais ser usado."""
+        with self._lock:
+            entry = self._entries.pop(os.path.abspath(path), None)
+        if entry is not None:
+            with entry["lock"]:
+                self._close(entry)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            entries, self._entries = list(self._entries.values()), {}
+        for entry in entries:
+            with entry["lock"]:
+                self._close(entry)
+
+@contextmanager
+def open_input(job_id: str, path: str):
+    """Usa o handle compartilhado do job; sem cache, abre e fecha localmente."""
+    cache = (JOBS.get(job_id) or {}).get("docs")
+    if isinstance(cache, JobDocCache):
+        with cache.use(path) as doc:
+            yield doc
+    else:
+        import fitz
+        with fitz.open(path) as doc:
+            yield doc
+
+def release_input(job_id: str, path: str):
+    """Fim do uso de uma entrada: fecha o handle dela e abre vaga para a próxima."""
+    cache = (JOBS.get(job_id) or {}).get("docs")
+    if isinstance(cache, JobDocCache):
+        cache.release(path)
+
+def release_job_docs(job_id: str):
+    job = JOBS.get(job_id)
+    cache = job.pop("docs", None) if job else None
+    if isinstance(cache, JobDocCache):
+        cache.close()
+
+# ==== Cadastro de funcionários ====
+ROSTER_PATH = os.path.join(DATA_DIR, "roster.csv")
+_ROSTER: Dict[str, Any] = {"mtime": None, "index": None}
+_ROSTER_LOCK = threading.Lock()
+
+def current_roster() -> RosterIndex | None:
+    """Índice do CSV enviado em /api/roster; recarregado só quando o arquivo muda."""
+    try:
+        mtime = os.path.getmtime(ROSTER_PATH)
+    except OSError:
+        return None
+    with _ROSTER_LOCK:
+        if _ROSTER["mtime"] != mtime:
+            with open(ROSTER_PATH, "rb") as f:
+                _ROSTER["index"] = RosterIndex.from_csv(f.read())
+            _ROSTER["mtime"] = mtime
+        return _ROSTER["index"] or None
+
+# ==== Estatísticas ====
+class FileStats:
+    """Contadores de um PDF de entrada; páginas manuais ficam como inteiros (1-based).
+
+    ``outputs`` é o manifesto página → arquivo gerado (índice = página - 1);
+    None marca página não gravada (modo plano cancelado no meio).
+    """
+    __slots__ = ("file", "pages", "renamed", "manual", "ocr", "layout", "patterns", "manual_pages", "outputs")
+
+    def __init__(self, file: str, pages: int = 0):
+        self.file = file
+        self.pages = pages
+        self.renamed = 0
+        self.manual = 0
+        self.ocr = 0
+        self.layout: str | None = None
+        self.patterns: dict = {}
+        self.manual_pages = array("I")
+        self.outputs: List[str | None] = []
+
+    def to_dict(self) -> dict:
+        return {"file": self.file, "pages": self.pages, "renamed": self.renamed, "manual": self.manual, "ocr": self.ocr, "layout": self.layout, "patterns": self.patterns}
+
+class JobStats:
+    """Agrega os FileStats de um job. A formatação em texto só acontece na borda da API."""
+    __slots__ = ("files",)
+
+    def __init__(self):
+        self.files: List[FileStats] = []
+
+    @property
+    def renamed(self) -> int:
+        return sum(f.renamed for f in self.files)
+
+    @property
+    def manual(self) -> int:
+        return sum(f.manual for f in self.files)
+
+    def summary(self) -> dict:
+        return {"renamed": self.renamed, "manual": self.manual, "files": [f.to_dict() for f in self.files]}
+
+    def manifest(self) -> List[dict]:
+        return [{"file": f.file, "outputs": list(f.outputs)} for f in self.files]
+
+    def iter_manual_labels(self):
+        for f in self.files:
+            for n in f.manual_pages:
+                yield f"Página {n} de {f.file}.pdf"
+
+    def manual_labels(self, offset: int = 0, limit: int = 100) -> List[str]:
+        return list(islice(self.iter_manual_labels(), offset, offset + limit))
+
+# ==== Nome da página ====
+class PageNamer:
+    """Resolve o nome de cada página de um documento: layout, padrões, OCR e cadastro.
+
+    Guarda o estado que vale para o documento inteiro (layout detectado na
+    primeira página reconhecível, ordem adaptativa dos padrões). ``use_ocr``
+    desligado limita a resolução à camada de texto (plano e prévia).
+    """
+
+    def __init__(self, base: str, stats: FileStats, use_ocr: bool = True):
+        self.base = base
+        self.stats = stats
+        self.use_ocr = use_ocr
+        self.roster_idx = current_roster()
+        self.layout = None
+        self.matcher = PatternMatcher(LAYOUTS)
+
+    def adopt(self, layout_name: str | None):
+        """Começa com o layout já conhecido (ex.: da prévia) em vez de detectá-lo."""
+        layout = LAYOUTS.get(layout_name)
+        if layout is not None and self.layout is None:
+            self.layout = layout
+            self.stats.layout = layout.name
+            self.matcher.pin(layout)
+
+    def page_text(self, page) -> str:
+        import fitz
+        if self.layout is not None and self.layout.header:
+            r = page.rect
+            return page.get_text("text", clip=fitz.Rect(r.x0, r.y0, r.x1, r.y0 + r.height * self.layout.header)) or ""
+        return page.get_text("text") or ""
+
+    def resolve_text(self, page) -> tuple:
+        """(nome ou None, nome cru) só pela camada de texto; detecta o layout na primeira
+        página reconhecível."""
+        raw_page_text = self.page_text(page)
+        text = clean_text(raw_page_text)
+        if self.layout is None:
+            self.layout = LAYOUTS.detect(text)
+            if self.layout is not None:
+                self.stats.layout = self.layout.name
+                self.matcher.pin(self.layout)
+        raw = self.matcher.extract(text, raw_page_text)
+        return (sanitize_name_tokens(raw) if raw else None), raw
+
+    def submit_ocr(self, page):
+        """Manda o cabeçalho ao OCR sem esperar (ocr.OcrTask); None sem OCR."""
+        if not self.use_ocr:
+            return None
+        return ocr.submit(page, self.layout.header if self.layout else None)
+
+    def resolve_ocr(self, ocr_text: str) -> tuple:
+        raw = self.matcher.extract(clean_text(ocr_text), ocr_text)
+        return (sanitize_name_tokens(raw) if raw else None), raw
+
+    def snap(self, final: str | None, raw: str | None) -> tuple:
+        """(nome, confiança do cadastro ou None)."""
+        confidence = None
+        if self.roster_idx is not None and raw:
+            # Encaixa o nome extraído (mesmo truncado/ruidoso) no cadastro
+            snapped, confidence = self.roster_idx.snap(raw)
+            if snapped: final = snapped
+        return final, confidence
+
+    def resolve(self, page, cancelled: Callable[[], bool] | None = None) -> tuple:
+        """(nome ou None, usou OCR, confiança do cadastro ou None), esperando o OCR."""
+        final, raw = self.resolve_text(page)
+        used_ocr = False
+        if not final:
+            # Fallback caro, pago só pelas páginas que falharam (ex.: escaneadas sem texto)
+            task = self.submit_ocr(page)
+            ocr_text = task.wait(cancelled) if task is not None else None
+            if ocr_text:
+                final, raw = self.resolve_ocr(ocr_text)
+                used_ocr = bool(final)
+        final, confidence = self.snap(final, raw)
+        return final, used_ocr, confidence
+
+    def label(self, i: int, final: str | None) -> str:
+        """Nome definitivo da página (MANUAL_ quando não resolvido)."""
+        return sanitize_filename(final) if final else sanitize_filename(f"MANUAL_{self.base}_{i+1}")
+
+    def count(self, i: int, final: str | None, used_ocr: bool = False):
+        if not final:
+            self.stats.manual += 1
+            self.stats.manual_pages.append(i+1)
+        else:
+            self.stats.renamed += 1
+            if used_ocr: self.stats.ocr += 1
+
+    def record(self, i: int, final: str | None, used_ocr: bool = False) -> str:
+        """Conta a página e devolve o nome definitivo."""
+        self.count(i, final, used_ocr)
+        return self.label(i, final)
+
+    def finish(self):
+        self.stats.patterns = self.matcher.to_dict()
+
+def page_bytes(doc, i: int, compress: bool) -> bytes:
+    """Página ``i`` de ``doc`` como um PDF próprio, comprimido."""
+    import fitz
+    out_doc = fitz.open()
+    out_doc.insert_pdf(doc, from_page=i, to_page=i)
+    # Otimização: Usar deflate, clean e garbage=4; tentar linear se suportado,
+    # caso contrário, faz fallback sem linear (algumas versões do PyMuPDF
+    # não suportam linearisation e podem lançar erro).
+    if compress:
+        try:
+            pdf_bytes = out_doc.write(garbage=4, deflate=True, clean=True, linear=True)
+        except Exception:
+            # Linearização não suportada — fallback seguro
+            pdf_bytes = out_doc.write(garbage=4, deflate=True, clean=True)
+    else:
+        pdf_bytes = out_doc.write()
+    out_doc.close()
+    return pdf_bytes
+
+# ==== Gravação em processos ====
+# A parte cara de cada página (insert_pdf + write com garbage=4) vai para um pool
+# de processos em blocos, enquanto a thread do job já nomeia as páginas seguintes.
+# O mesmo pool grava o modo plano e calcula a prévia.
+_exec_pool = None
+_exec_lock = threading.Lock()
+_DEPTH: Dict[str, Dict[str, int]] = {}  # job → páginas esperando OCR e blocos/páginas gravando
+_DEPTH_LOCK = threading.Lock()
+
+def _get_exec_pool():
+    global _exec_pool
+    with _exec_lock:
+        if _exec_pool is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            # spawn: como o pool de OCR, sem herdar threads do servidor
+            _exec_pool = ProcessPoolExecutor(max_workers=EXEC_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _exec_pool
+
+def shutdown_exec_pool():
+    global _exec_pool
+    with _exec_lock:
+        pool, _exec_pool = _exec_pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+def track_depth(job_id: str, **delta: int):
+    with _DEPTH_LOCK:
+        depth = _DEPTH.setdefault(job_id, {"ocr": 0, "write_chunks": 0, "write_pages": 0})
+        for k, v in delta.items():
+            depth[k] += v
+        if not any(depth.values()):
+            del _DEPTH[job_id]
+
+def pipeline_snapshot() -> dict:
+    """Filas do pipeline por job (ver /api/metrics)."""
+    with _DEPTH_LOCK:
+        jobs = {job_id: dict(depth) for job_id, depth in _DEPTH.items()}
+    return {
+        "exec_workers": EXEC_WORKERS, "write_chunk": WRITE_CHUNK, "job_chunks": JOB_CHUNKS,
+        **{k: sum(d[k] for d in jobs.values()) for k in ("ocr", "write_chunks", "write_pages")},
+        "jobs": jobs,
+    }
+
+def _write_pages(src_pdf: str, pages: List[tuple], compress: bool, stop_path: str) -> List[int]:
+    # Roda no processo do pool: abre o PDF de entrada e grava as páginas (índice 0-based, caminho).
+    # O cancelamento chega pelo arquivo ``stop_path``, conferido antes de cada página;
+    # cada página vai para um .part e só entra no caminho final inteira.
+    import fitz
+    written = []
+    with fitz.open(src_pdf) as doc:
+        for i, path in pages:
+            if os.path.exists(stop_path):
+                break
+            data = page_bytes(doc, i, compress)
+            with open(path + ".part", "wb") as f: f.write(data)
+            os.replace(path + ".part", path)
+            written.append(i)
+    return written
+
+class ChunkWriter:
+    """Grava páginas de um PDF de entrada em blocos no pool de processos.
+
+    add() junta (página, caminho) até ``chunk`` páginas e envia o bloco; com
+    ``depth`` blocos no ar, espera o mais antigo voltar antes de enviar outro.
+    Os blocos voltam na ordem de envio e ``on_written(i)`` roda na thread do
+    job para cada página gravada. ``gate(n)``, se dado, roda antes de cada envio
+    com o nº de páginas do bloco (vez no escalonador); False cancela o envio.
+    close() sem finish() (cancelamento ou erro)
+    descarta os blocos na fila e para os que já rodam na página seguinte — o
+    pool é compartilhado, então em vez de matar workers há um arquivo de parada.
+    """
+    __slots__ = ("job_id", "src_pdf", "compress", "stop_path", "on_written", "chunk", "depth",
+                 "cancelled", "gate", "batch", "inflight")
+
+    def __init__(self, job_id: str, src_pdf: str, compress: bool, stop_path: str, on_written: Callable[[int], None],
+                 chunk: int, depth: int = JOB_CHUNKS, cancelled: Callable[[], bool] | None = None,
+                 gate: Callable[[int], bool] | None = None):
+        self.job_id = job_id
+        self.src_pdf = src_pdf
+        self.compress = compress
+        self.stop_path = stop_path
+        self.on_written = on_written
+        self.chunk = max(1, chunk)
+        self.depth = max(1, depth)
+        self.cancelled = cancelled or (lambda: False)
+        self.gate = gate
+        self.batch: List[tuple] = []
+        self.inflight: deque = deque()  # (Future, páginas) na ordem de envio
+
+    def add(self, i: int, path: str) -> bool:
+        """Enfileira a página; False se o job foi cancelado esperando vaga."""
+        self.batch.append((i, path))
+        return len(self.batch) < self.chunk or self._send()
+
+    def _send(self) -> bool:
+        self.poll()
+        while len(self.inflight) >= self.depth:
+            if not self._collect(block=True):
+                return False
+        if self.gate is not None and not self.gate(len(self.batch)):
+            return False
+        pages, self.batch = self.batch, []
+        fut = _get_exec_pool().submit(_write_pages, self.src_pdf, pages, self.compress, self.stop_path)
+        self.inflight.append((fut, len(pages)))
+        track_depth(self.job_id, write_chunks=1, write_pages=len(pages))
+        return True
+
+    def _collect(self, block: bool) -> bool:
+        # Colhe o bloco mais antigo; False se não terminou (ou o job foi cancelado esperando)
+        from concurrent.futures import wait
+        fut, n = self.inflight[0]
+        while not fut.done():
+            if not block or self.cancelled():
+                return False
+            wait([fut], timeout=0.25)
+        self.inflight.popleft()
+        track_depth(self.job_id, write_chunks=-1, write_pages=-n)
+        for i in fut.result():
+            self.on_written(i)
+        return True
+
+    def poll(self):
+        """Colhe os blocos já gravados, sem esperar (eventos de progresso em dia)."""
+        while self.inflight and self._collect(block=False):
+            pass
+
+    def finish(self) -> bool:
+        """Envia o resto e espera tudo; False se cancelado no meio."""
+        if self.batch and not self._send():
+            return False
+        while self.inflight:
+            if not self._collect(block=True):
+                return False
+        return True
+
+    def close(self):
+        self.batch = []
+        if not self.inflight:
+            return
+        # Cancelado ou com erro: descarta a fila, para os blocos em andamento e espera
+        # voltarem, para nenhuma página ser gravada depois do zip parcial
+        from concurrent.futures import wait
+        with open(self.stop_path, "w"): pass
+        try:
+            for fut, _ in self.inflight:
+                fut.cancel()
+            wait([fut for fut, _ in self.inflight])
+            while self.inflight:
+                fut, n = self.inflight.popleft()
+                track_depth(self.job_id, write_chunks=-1, write_pages=-n)
+                if not fut.cancelled() and fut.exception() is None:
+                    for i in fut.result():
+                        self.on_written(i)
+        finally:
+            os.remove(self.stop_path)
+
+# ==== Core (Sequencial e Estável) ====
+def process_pdf_to_folder(src_pdf: str, out_dir: str, job_id: str, compress: bool, is_metric_run: bool = False,
+                          stats: FileStats | None = None, chunk: int | None = None):
+    """Desmembra ``src_pdf`` em ``out_dir``, uma página por PDF com o nome resolvido.
+
+    A thread do job lê e nomeia as páginas; a gravação sai em blocos de ``chunk``
+    páginas (padrão WRITE_CHUNK) para o pool de processos (ChunkWriter), com até
+    JOB_CHUNKS blocos no ar, e o OCR até OCR_WORKERS páginas no ar. Uma página só
+    conta (manifesto, contadores, page_done) depois de gravada. ``chunk=0`` grava
+    na própria thread, página a página.
+    """
+    base = os.path.splitext(os.path.basename(src_pdf))[0]
+    if not is_metric_run: os.makedirs(out_dir, exist_ok=True)
+    if stats is None: stats = FileStats(base)
+    namer = PageNamer(base, stats)
+    known = preview_names(src_pdf)  # nomes já resolvidos por /api/preview
+    if known: namer.adopt(known["layout"])
+    cancelled = cancel_token(job_id)
+    turns = page_turns(job_id)
+    chunk = WRITE_CHUNK if chunk is None else chunk
+    # Páginas esperando OCR (índice, nome cru do texto, ocr.OcrTask): até OCR_WORKERS no
+    # ar por job, enquanto as páginas seguintes andam; fecham na ordem de envio
+    awaiting: deque = deque()
+    taken = set() if is_metric_run else set(os.listdir(out_dir))  # nomes já usados na pasta
+    writing: Dict[int, tuple] = {}  # índice → (arquivo, nome, resolvido, usou OCR, confiança) no ar
+
+    def written(i: int):
+        output, name, final, used_ocr, confidence = writing.pop(i)
+        namer.count(i, final, used_ocr)
+        if not is_metric_run: stats.outputs[i] = output
+        page_event = {"file": base, "page": i+1, "newName": name}
+        if used_ocr: page_event["ocr"] = True
+        if confidence is not None: page_event["confidence"] = confidence
+        emit_from_worker(job_id, "page_done", page_event)
+
+    writer = None
+    if chunk > 0 and not is_metric_run:
+        writer = ChunkWriter(job_id, src_pdf, compress, os.path.join(out_dir, ".parar"), written, chunk, cancelled=cancelled)
+
+    def settle(doc, i: int, final: str | None, used_ocr: bool, confidence) -> bool:
+        name = namer.label(i, final)
+        output, k = f"{name}.pdf", 1
+        while output in taken:
+            output = f"{name}_{k}.pdf"; k += 1
+        writing[i] = (output, name, final, used_ocr, confidence)
+        if is_metric_run:
+            written(i)
+            return True
+        taken.add(output)
+        if writer is not None:
+            return writer.add(i, os.path.join(out_dir, output))
+        with open(os.path.join(out_dir, output), "wb") as f: f.write(page_bytes(doc, i, compress))
+        written(i)
+        return True
+
+    def settle_oldest(doc) -> bool:
+        i, raw, task = awaiting.popleft()
+        track_depth(job_id, ocr=-1)
+        ocr_text = task.wait(cancelled)
+        if cancelled():
+            return False
+        final, used_ocr = None, False
+        if ocr_text:
+            final, raw = namer.resolve_ocr(ocr_text)
+            used_ocr = bool(final)
+        final, confidence = namer.snap(final, raw)
+        return settle(doc, i, final, used_ocr, confidence)
+
+    with open_input(job_id, src_pdf) as doc, paused_after(turns):
+        total = doc.page_count
+        stats.pages = total
+        emit_from_worker(job_id, "file_start", {"file": base, "pages": total})
+        try:
+            for i in range(total):
+                # Cancelamento cooperativo; com escalonador, espera a vez desta página
+                if cancelled() or (turns is not None and not turns.turn(cancelled)):
+                    break
+                if not is_metric_run:
+                    stats.outputs.append(None)  # manifesto por página, preenchido na gravação
+                if known and known["names"][i]:
+                    final, used_ocr, confidence = known["names"][i], False, known["confidence"][i]
+                else:
+                    page = doc.load_page(i)
+                    final, raw = namer.resolve_text(page)
+                    task = None if final else namer.submit_ocr(page)
+                    if task is not None:
+                        # Fallback caro, pago só pelas páginas que falharam (ex.: escaneadas sem texto)
+                        awaiting.append((i, raw, task))
+                        track_depth(job_id, ocr=1)
+                        if len(awaiting) >= ocr.OCR_WORKERS and not settle_oldest(doc):
+                            break
+                        continue
+                    used_ocr = False
+                    final, confidence = namer.snap(final, raw)
+                if cancelled():
+                    break  # antes da escrita (garbage=4/linear), a parte cara da página
+                if not settle(doc, i, final, used_ocr, confidence):
+                    break
+            while awaiting and settle_oldest(doc):
+                pass
+            if writer is not None and not cancelled():
+                writer.finish()
+        finally:
+            # Cancelado (ou erro): OCR pendente é descartado e blocos no ar param; páginas
+            # não gravadas ficam fora do manifesto (None)
+            for _, _, task in awaiting:
+                task.cancel()
+            track_depth(job_id, ocr=-len(awaiting))
+            if writer is not None:
+                writer.close()
+    namer.finish()
+    return stats
+
+def _walk_entries(folder: str):
+    for root, _, files in os.walk(folder):
+        for fn in files:
+            full = os.path.join(root, fn)
+            yield full, os.path.relpath(full, folder)
+
+def make_zip(folder: str, zip_path: str, cancelled: Callable[[], bool] | None = None, entries=None):
+    """Monta num .part e renomeia no fim: um zip interrompido nunca fica no caminho final.
+    Com ``cancelled``, confere o cancelamento a cada arquivo e levanta JobCancelled.
+    ``entries``: pares (caminho, nome no zip) no lugar de varrer ``folder``."""
+    from zipfile import ZipFile, ZIP_DEFLATED
+    tmp_path = zip_path + ".part"
+    try:
+        # Otimização: Usar ZIP_DEFLATED com compresslevel=6 para melhor compressão
+        with ZipFile(tmp_path, "w", compression=ZIP_DEFLATED, compresslevel=6) as zf:
+            for full, arc in (_walk_entries(folder) if entries is None else entries):
+                if cancelled is not None and cancelled():
+                    raise JobCancelled()
+                zf.write(full, arcname=arc)
+        os.replace(tmp_path, zip_path)
+    except BaseException:
+        try: os.remove(tmp_path)
+        except OSError: pass
+        raise
+
+def register_artifact(job_id: str, name: str, path: str, source: str | None = None) -> str:
+    """Libera ``path`` para download e devolve a URL pública do artefato.
+    Com ``source``, o zip só é montado (a partir dessa pasta) no primeiro download."""
+    job = JOBS.get(job_id)
+    if job is not None:
+        job.setdefault("artifacts", {})[name] = path
+        if source is not None:
+            job.setdefault("artifact_sources", {})[name] = source
+    return f"/api/jobs/{job_id}/artifacts/{quote(name)}"
+
+def ensure_artifact(job_id: str, name: str) -> str | None:
+    """Caminho do artefato pronto para servir, montando os preguiçosos sob demanda."""
+    job = JOBS.get(job_id) or {}
+    path = (job.get("artifacts") or {}).get(name)
+    if not path:
+        return None
+    source = (job.get("artifact_sources") or {}).get(name)
+    if source is not None and not os.path.isfile(path):
+        with job.setdefault("artifact_lock", threading.Lock()):
+            if not os.path.isfile(path):
+                # Mesma organização (output_layout) do zip de um job concluído
+                make_zip(source, path, entries=zip_entries(job_id))
+    return path if os.path.isfile(path) else None
+
+def set_status(job_id: str, status: str, **extra):
+    job = JOBS.get(job_id)
+    if job is not None:
+        job["status"] = status
+        job.update(extra)
+
+# ==== Organização do zip ====
+# O zip é montado a partir do manifesto (FileStats.outputs), sem copiar nem mover
+# os PDFs gravados: o layout só decide o nome de cada página dentro do arquivo.
+#   source    PDF de origem/NOME.pdf (padrão, como sempre foi)
+#   flat      NOME.pdf, tudo na raiz (_k entre arquivos de origem)
+#   employee  NOME/PDF de origem.pdf — as páginas da pessoa em todos os arquivos
+#   merged    NOME.pdf com todas as páginas da pessoa num PDF só
+# Nos três últimos as páginas sem nome ficam em MANUAL/.
+OUTPUT_LAYOUTS = ("source", "flat", "employee", "merged")
+_SUFFIX_RE = re.compile(r"_\d+$")
+
+def _unique(arc: str, used: set) -> str:
+    stem, ext = os.path.splitext(arc)
+    k = 1
+    while arc in used:
+        arc = f"{stem}_{k}{ext}"; k += 1
+    used.add(arc)
+    return arc
+
+def iter_pages(stats: JobStats):
+    """(FileStats, página, arquivo gerado, dono) de cada página gravada, na ordem do manifesto.
+    ``dono`` é o nome do funcionário (sem o sufixo _k) ou None nas páginas MANUAL."""
+    for fs in stats.files:
+        manual = set(fs.manual_pages)
+        for i, output in enumerate(fs.outputs):
+            if output is None:
+                continue
+            yield fs, i+1, output, (None if (i+1) in manual else _SUFFIX_RE.sub("", output[:-len(".pdf")]))
+
+def archive_entries(job: dict) -> List[tuple]:
+    """(caminho no disco, nome no zip, dono) de cada página gravada, na ordem do manifesto."""
+    layout = job.get("output_layout", "source")
+    root_processing_dir = os.path.join(job["out"], "arquivos_processados")
+    used, entries = set(), []
+    for fs, _, output, owner in iter_pages(job["stats"]):
+        if layout == "source":
+            arc = f"{fs.file}/{output}"
+        elif owner is None:
+            arc = f"MANUAL/{output}"
+        elif layout == "flat":
+            arc = output
+        else:
+            arc = f"{owner}/{fs.file}.pdf"
+        entries.append((os.path.join(root_processing_dir, fs.file, output), _unique(arc, used), owner))
+    return entries
+
+def merge_pdfs(paths: List[str], out_path: str, cancelled: Callable[[], bool] | None = None):
+    """Junta PDFs já gravados (páginas soltas) num só, sem reprocessar as fontes."""
+    import fitz
+    with fitz.open() as out_doc:
+        for path in paths:
+            if cancelled is not None and cancelled():
+                raise JobCancelled()
+            with fitz.open(path) as page_doc:
+                out_doc.insert_pdf(page_doc)
+        # garbage=4 deduplica fontes e imagens repetidas entre as páginas
+        out_doc.save(out_path, garbage=4, deflate=True, clean=True)
+
+def merge_by_employee(job: dict, entries: List[tuple], cancelled: Callable[[], bool] | None = None) -> List[tuple]:
+    """Junta as páginas de cada funcionário num PDF (pasta por_funcionario/); MANUAL seguem soltas."""
+    merged_dir = os.path.join(job["out"], "por_funcionario")
+    os.makedirs(merged_dir, exist_ok=True)
+    groups: Dict[str, List[str]] = {}
+    loose = []
+    for path, arc, owner in entries:
+        if owner is None:
+            loose.append((path, arc))
+        else:
+            groups.setdefault(owner, []).append(path)
+    result = []
+    for owner, paths in groups.items():
+        out_path = os.path.join(merged_dir, f"{owner}.pdf")
+        merge_pdfs(paths, out_path, cancelled)  # confere o cancelamento a cada página
+        result.append((out_path, f"{owner}.pdf"))
+    return result + loose
+
+def zip_entries(job_id: str, cancelled: Callable[[], bool] | None = None) -> List[tuple] | None:
+    """Pares (caminho, nome no zip) do layout do job; None no layout padrão (varre a pasta)."""
+    job = JOBS[job_id]
+    layout = job.get("output_layout", "source")
+    if layout == "source":
+        return None
+    entries = archive_entries(job)
+    if layout == "merged":
+        return merge_by_employee(job, entries, cancelled)
+    return [(path, arc) for path, arc, _ in entries]
+
+def finish_job(job_id: str, root_processing_dir: str):
+    """Zip final (ou o parcial preguiçoso, se cancelado) e o evento de encerramento."""
+    job = JOBS[job_id]
+    base_out_dir, total_stats = job["out"], job["stats"]
+    cancelled = cancel_token(job_id)
+    urls = []
+    original_filenames = [os.path.basename(p) for p in job["in"]]
+    if job["in"] and not cancelled():
+        zip_filename = generate_zip_filename(original_filenames)
+        zip_path = os.path.join(base_out_dir, zip_filename)
+        try:
+            make_zip(root_processing_dir, zip_path, cancelled, zip_entries(job_id, cancelled))
+            urls.append(register_artifact(job_id, zip_filename, zip_path))
+        except JobCancelled:
+            pass
+    # Se cancelado, o zip parcial do que foi gerado até agora só é montado se for baixado
+    if cancelled():
+        zip_filename = "parcial_cancelado.zip"
+        zip_path = os.path.join(base_out_dir, zip_filename)
+        urls.append(register_artifact(job_id, zip_filename, zip_path, source=root_processing_dir))
+        set_status(job_id, "cancelled", urls=urls)
+        emit_from_worker(job_id, "cancelled", {"urls": urls, "summary": total_stats.summary(), "summary_url": f"/api/jobs/{job_id}/summary"})
+    else:
+        set_status(job_id, "finished", urls=urls)
+        emit_from_worker(job_id, "finished", {"urls": urls, "summary": total_stats.summary(), "summary_url": f"/api/jobs/{job_id}/summary"})
+
+def process_normal_job(job_id: str, inputs=None):
+    """``inputs``: iterável de PDFs consumido à medida que chegam (upload em streaming);
+    quem o alimenta também os acrescenta em job["in"]. Padrão: job["in"] inteiro."""
+    try:
+        job = JOBS[job_id]
+        set_status(job_id, "running")
+        base_out_dir, compress = job["out"], job["compress_mode"]
+        total_stats = job.setdefault("stats", JobStats())
+        root_processing_dir = os.path.join(base_out_dir, "arquivos_processados")
+        os.makedirs(root_processing_dir, exist_ok=True)
+        cancelled = cancel_token(job_id)
+        for src_pdf_path in (job["in"] if inputs is None else inputs):
+            if cancelled():
+                break
+            file_basename = os.path.splitext(os.path.basename(src_pdf_path))[0]
+            file_specific_dir = os.path.join(root_processing_dir, file_basename)
+            # Registrado antes de processar para que /api/jobs/{id} acompanhe o arquivo em andamento
+            file_stats = FileStats(file_basename)
+            total_stats.files.append(file_stats)
+            process_pdf_to_folder(src_pdf_path, file_specific_dir, job_id, compress, is_metric_run=False, stats=file_stats)
+            release_input(job_id, src_pdf_path)
+            if cancelled():
+                break
+        finish_job(job_id, root_processing_dir)
+        # agendar limpeza (best-effort) após alguns segundos
+        try:
+            asyncio.get_event_loop().call_later(120, lambda: shutil.rmtree(base_out_dir, ignore_errors=True))
+        except Exception:
+            pass
+    except Exception as e:
+        set_status(job_id, "error", error=str(e))
+        emit_from_worker(job_id, "error", {"message": str(e)})
+    finally:
+        release_job_docs(job_id)
+
+def process_metric_job(job_id: str):
+    try:
+        job = JOBS[job_id]
+        set_status(job_id, "running")
+        compress = job["compress_mode"]
+        t0 = time.perf_counter()
+        total_pages = 0
+        for target_pdf in job["in"]:
+            with open_input(job_id, target_pdf) as d: total_pages += d.page_count
+            process_pdf_to_folder(target_pdf, None, job_id, compress, is_metric_run=True)
+            release_input(job_id, target_pdf)
+        elapsed = round(time.perf_counter() - t0, 2)
+        ram = 0.0
+        try:
+            import psutil
+            ram = round(psutil.Process(os.getpid()).memory_info().rss / 1024 / 1024, 1)
+        except Exception: pass
+        metric = {"pages": total_pages, "time": elapsed, "ram": ram}
+        set_status(job_id, "finished", metric=metric)
+        emit_from_worker(job_id, "metric", metric)
+    except Exception as e:
+        set_status(job_id, "error", error=str(e))
+        emit_from_worker(job_id, "error", {"message": str(e)})
+    finally:
+        release_job_docs(job_id)
+
+# ==== Correções depois do job ====
+def rename_outputs(job_id: str, changes: List[dict]) -> List[dict]:
+    """Renomeia páginas já gravadas de um job concluído ({"file", "page", "name"}).
+
+    Mexe só em nomes: os PDFs da pasta de saída são renomeados no lugar, o
+    manifesto é atualizado e o zip final é refeito por archive.repack_zip,
+    copiando as entradas comprimidas sem recomprimir. Colisões ganham o
+    sufixo _k como no desmembramento. Levanta ValueError sem alterar nada se
+    alguma correção for inválida.
+    """
+    import archive
+    job = JOBS[job_id]
+    if job.get("output_layout") == "merged":
+        raise ValueError("zip com PDFs juntados por funcionário: renomear exige reprocessar")
+    # Validação e nomes novos dentro do lock: duas correções simultâneas não partem
+    # do mesmo manifesto
+    with job.setdefault("artifact_lock", threading.Lock()):
+        stats = job["stats"]
+        by_file = {f.file: f for f in stats.files}
+        wanted: Dict[tuple, str] = {}  # a última correção de cada página vale
+        for ch in changes:
+            ch = ch if isinstance(ch, dict) else {}
+            fs, page = by_file.get(ch.get("file")), ch.get("page")
+            if fs is None or not isinstance(page, int) or not 1 <= page <= len(fs.outputs) or fs.outputs[page-1] is None:
+                raise ValueError(f"página desconhecida: {ch.get('file')} {page}")
+            name = corrected_name(ch.get("name"))
+            if not name:
+                raise ValueError(f"nome vazio: {fs.file} {page}")
+            wanted[(fs.file, page)] = name
+        taken = {f.file: set(o for o in f.outputs if o) for f in stats.files}
+        updates = []
+        for (file, page), name in wanted.items():
+            fs = by_file[file]
+            old = fs.outputs[page-1]
+            taken[file].discard(old)
+            new, k = f"{name}.pdf", 1
+            while new in taken[file]:
+                new = f"{name}_{k}.pdf"; k += 1
+            taken[file].add(new)
+            if new != old:
+                updates.append((fs, page, old, new))
+        if not updates:
+            return []
+        root_processing_dir = os.path.join(job["out"], "arquivos_processados")
+        sources = job.get("artifact_sources") or {}
+        zips = [p for n, p in (job.get("artifacts") or {}).items() if n not in sources and os.path.isfile(p)]
+        # Nome no zip antes e depois, pelo mesmo índice que montou o zip (o _k de outras
+        # páginas pode mudar junto nos layouts flat/employee)
+        before = {path: arc for path, arc, _ in archive_entries(job)}
+        saved = [(fs, list(fs.outputs), array("I", fs.manual_pages), fs.manual, fs.renamed) for fs in by_file.values()]
+        for fs, page, old, new in updates:
+            fs.outputs[page-1] = new
+            if page in fs.manual_pages:
+                fs.manual_pages.remove(page)
+                fs.manual -= 1
+                fs.renamed += 1
+        moved = {os.path.join(root_processing_dir, fs.file, old): os.path.join(root_processing_dir, fs.file, new)
+                 for fs, _, old, new in updates}
+        after = {path: arc for path, arc, _ in archive_entries(job)}
+        renames = {arc: after[moved.get(path, path)] for path, arc in before.items() if after[moved.get(path, path)] != arc}
+        done = []  # (de, para) já renomeados no disco, para desfazer
+        try:
+            for zip_path in zips:
+                archive.repack_zip(zip_path, zip_path + ".part", renames)
+            # Duas fases: um nome liberado nesta leva pode ser o destino de outra página
+            for n, (fs, page, old, new) in enumerate(updates):
+                folder = os.path.join(root_processing_dir, fs.file)
+                step = (os.path.join(folder, old), os.path.join(folder, f".renomeando_{n}"))
+                os.replace(*step)
+                done.append(step)
+            for n, (fs, page, old, new) in enumerate(updates):
+                folder = os.path.join(root_processing_dir, fs.file)
+                step = (os.path.join(folder, f".renomeando_{n}"), os.path.join(folder, new))
+                os.replace(*step)
+                done.append(step)
+            for zip_path in zips:
+                os.replace(zip_path + ".part", zip_path)
+        except BaseException:
+            # Desfaz na ordem inversa: arquivos, manifesto e zips voltam ao que eram
+            for src, dst in reversed(done):
+                try: os.replace(dst, src)
+                except OSError: pass
+            for fs, outputs, manual_pages, manual, renamed in saved:
+                fs.outputs, fs.manual_pages, fs.manual, fs.renamed = outputs, manual_pages, manual, renamed
+            for zip_path in zips:
+                try: os.remove(zip_path + ".part")
+                except OSError: pass
+            raise
+    return [{"file": fs.file, "page": page, "from": old, "to": new} for fs, page, old, new in updates]
+
+# ==== Modo plano: nomear tudo antes, gravar depois ====
+# Passo 1 (plan_job): só a camada de texto, sem OCR nem escrita; os nomes de
+# saída e os sufixos _k saem em ordem de página, então o plano é determinístico
+# e pode ser revisado/corrigido (apply_plan_changes) antes de virar arquivo.
+# Passo 2 (execute_plan_job): grava as páginas do plano em processos paralelos.
+def plan_pdf(src_pdf: str, job_id: str, stats: FileStats) -> List[dict]:
+    """Entradas {"page", "name", "manual"[, "confidence"]} de um PDF, em ordem de página."""
+    namer = PageNamer(stats.file, stats, use_ocr=False)
+    known = preview_names(src_pdf)
+    if known: namer.adopt(known["layout"])
+    cancelled = cancel_token(job_id)
+    turns = page_turns(job_id)
+    entries = []
+    with open_input(job_id, src_pdf) as doc, paused_after(turns):
+        stats.pages = doc.page_count
+        for i in range(doc.page_count):
+            if cancelled() or (turns is not None and not turns.turn(cancelled)):
+                break
+            if known and known["names"][i]:
+                final, confidence = known["names"][i], known["confidence"][i]
+            else:
+                final, _, confidence = namer.resolve(doc.load_page(i))
+            entry = {"page": i+1, "name": namer.record(i, final), "manual": not final}
+            if confidence is not None: entry["confidence"] = confidence
+            entries.append(entry)
+    namer.finish()
+    return entries
+
+def assign_outputs(entries: List[dict]) -> List[dict]:
+    """Nome do arquivo de cada entrada: NOME.pdf, NOME_1.pdf... na ordem das páginas."""
+    used = set()
+    for e in entries:
+        out, k = f"{e['name']}.pdf", 1
+        while out in used:
+            out = f"{e['name']}_{k}.pdf"; k += 1
+        used.add(out)
+        e["output"] = out
+    return entries
+
+def plan_job(job_id: str):
+    try:
+        job = JOBS[job_id]
+        set_status(job_id, "planning")
+        total_stats = job.setdefault("stats", JobStats())
+        plan = job["plan"] = []
+        cancelled = cancel_token(job_id)
+        for src_pdf_path in job["in"]:
+            if cancelled():
+                break
+            file_stats = FileStats(os.path.splitext(os.path.basename(src_pdf_path))[0])
+            total_stats.files.append(file_stats)
+            entries = assign_outputs(plan_pdf(src_pdf_path, job_id, file_stats))
+            release_input(job_id, src_pdf_path)
+            plan.append({"file": file_stats.file, "src": src_pdf_path, "entries": entries})
+            emit_from_worker(job_id, "plan", {"file": file_stats.file, "entries": entries})
+        if cancelled():
+            set_status(job_id, "cancelled", urls=[])
+            emit_from_worker(job_id, "cancelled", {"urls": [], "summary": total_stats.summary(), "summary_url": f"/api/jobs/{job_id}/summary"})
+        else:
+            set_status(job_id, "planned")
+            emit_from_worker(job_id, "planned", {"plan_url": f"/api/jobs/{job_id}/plan", "summary": total_stats.summary()})
+    except Exception as e:
+        set_status(job_id, "error", error=str(e))
+        emit_from_worker(job_id, "error", {"message": str(e)})
+    finally:
+        release_job_docs(job_id)
+
+def apply_plan_changes(job_id: str, changes: List[dict]) -> int:
+    """Aplica correções {"file", "page", "name"} ao plano e refaz os nomes de saída.
+    Levanta ValueError para arquivo/página desconhecidos ou nome vazio."""
+    job = JOBS[job_id]
+    by_file = {item["file"]: item for item in job.get("plan") or []}
+    updates = []  # valida tudo antes de mexer no plano
+    for ch in changes:
+        ch = ch if isinstance(ch, dict) else {}
+        item = by_file.get(ch.get("file"))
+        page = ch.get("page")
+        if item is None or not isinstance(page, int) or not 1 <= page <= len(item["entries"]):
+            raise ValueError(f"página desconhecida: {ch.get('file')} {page}")
+        name = corrected_name(ch.get("name"))
+        if not name:
+            raise ValueError(f"nome vazio: {item['file']} {page}")
+        updates.append((item, page, name))
+    for item, page, name in updates:
+        entry = item["entries"][page-1]
+        entry.update(name=name, manual=False, edited=True)
+        entry.pop("confidence", None)
+    for item in {id(item): item for item, _, _ in updates}.values():
+        assign_outputs(item["entries"])
+    return len(updates)
+
+def execute_plan_job(job_id: str):
+    """Grava o plano revisado: blocos de EXEC_CHUNK páginas em processos separados
+    (ChunkWriter), com até JOB_CHUNKS blocos do job no ar. Cada bloco pede a sua
+    vez no escalonador e paga a cota pelas páginas que leva, como no modo direto.
+    No cancelamento, blocos na fila são descartados e os que já rodam param na
+    página seguinte (arquivo de parada); o job só fecha depois que todos voltam."""
+    try:
+        job = JOBS[job_id]
+        set_status(job_id, "running")
+        base_out_dir, compress = job["out"], job["compress_mode"]
+        root_processing_dir = os.path.join(base_out_dir, "arquivos_processados")
+        planned = {f.file: f for f in job["stats"].files}
+        total_stats = job["stats"] = JobStats()
+        cancelled = cancel_token(job_id)
+        turns = page_turns(job_id)
+        gate = None if turns is None else (lambda n: turns.turn(cancelled, cost=n))
+        stop_path = os.path.join(base_out_dir, ".parar")
+        for item in job["plan"]:
+            if cancelled():
+                break
+            base, entries = item["file"], item["entries"]
+            by_page = {e["page"]: e for e in entries}
+            file_stats = FileStats(base, len(entries))
+            if base in planned:
+                file_stats.layout, file_stats.patterns = planned[base].layout, planned[base].patterns
+            total_stats.files.append(file_stats)
+            out_dir = os.path.join(root_processing_dir, base)
+            os.makedirs(out_dir, exist_ok=True)
+            emit_from_worker(job_id, "file_start", {"file": base, "pages": len(entries)})
+            done = set()
+
+            def written(i: int):
+                e = by_page[i+1]
+                done.add(e["page"])
+                emit_from_worker(job_id, "page_done", {"file": base, "page": e["page"], "newName": e["name"]})
+
+            writer = ChunkWriter(job_id, item["src"], compress, stop_path, written, EXEC_CHUNK, cancelled=cancelled, gate=gate)
+            with paused_after(turns):
+                try:
+                    for e in entries:
+                        if cancelled() or not writer.add(e["page"]-1, os.path.join(out_dir, e["output"])):
+                            break
+                    else:
+                        writer.finish()
+                finally:
+                    writer.close()
+            # Manifesto e contadores só com o que foi gravado (None nas páginas que ficaram de fora)
+            file_stats.outputs = [e["output"] if e["page"] in done else None for e in entries]
+            for e in entries:
+                if e["page"] not in done:
+                    continue
+                if e["manual"]:
+                    file_stats.manual += 1
+                    file_stats.manual_pages.append(e["page"])
+                else:
+                    file_stats.renamed += 1
+        finish_job(job_id, root_processing_dir)
+    except Exception as e:
+        set_status(job_id, "error", error=str(e))
+        emit_from_worker(job_id, "error", {"message": str(e)})
+    finally:
+        release_job_docs(job_id)
+
+# ==== Prévia de nomes ====
+# Só camada de texto e padrões, com as páginas de cada PDF divididas entre os
+# processos do pool de gravação. O resultado fica num LRU em memória indexado
+# pelo conteúdo do PDF (e pela versão do cadastro): se o mesmo arquivo vier
+# depois num job de verdade, as páginas já nomeadas não são lidas de novo —
+# só as que falharam passam pelo caminho completo (com OCR).
+_PREVIEW: "OrderedDict[tuple, dict]" = OrderedDict()
+_PREVIEW_LOCK = threading.Lock()
+
+def file_digest(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _preview_key(digest: str) -> tuple:
+    # Cadastro novo muda o encaixe dos nomes: a prévia antiga deixa de valer
+    try: roster_mtime = os.path.getmtime(ROSTER_PATH)
+    except OSError: roster_mtime = None
+    return digest, roster_mtime
+
+def preview_names(src_pdf: str) -> dict | None:
+    """Nomes guardados de uma prévia do mesmo PDF: {"layout", "names", "confidence"}."""
+    if not _PREVIEW:
+        return None  # sem prévias, nem calcula o hash
+    key = _preview_key(file_digest(src_pdf))
+    with _PREVIEW_LOCK:
+        known = _PREVIEW.get(key)
+        if known is not None:
+            _PREVIEW.move_to_end(key)
+        return known
+
+def _preview_range(src_pdf: str, start: int, stop: int, layout_name: str | None = None) -> tuple:
+    # Roda no processo do pool: (layout, [(nome, confiança)]) das páginas start..stop-1.
+    # O layout vem detectado da página 0 em diante (preview_pdf); sem ele, o bloco detecta sozinho
+    import fitz
+    stats = FileStats("")
+    namer = PageNamer("", stats, use_ocr=False)
+    namer.adopt(layout_name)
+    out = []
+    with fitz.open(src_pdf) as doc:
+        for i in range(start, stop):
+            final, _, confidence = namer.resolve(doc.load_page(i))
+            out.append((final, confidence))
+    return stats.layout, out
+
+def detect_layout(doc, limit: int = PREVIEW_CHUNK) -> str | None:
+    """Layout da primeira página reconhecível entre as ``limit`` primeiras."""
+    for i in range(min(limit, doc.page_count)):
+        layout = LAYOUTS.detect(clean_text(doc.load_page(i).get_text("text") or ""))
+        if layout is not None:
+            return layout.name
+    return None
+
+def preview_pdf(src_pdf: str, turns=None) -> dict:
+    """Nomes de todas as páginas sem gravar nada; guarda o resultado para o job seguinte.
+
+    Com ``turns`` (PageTurns do cliente), cada bloco enviado ao pool pede a sua vez
+    no escalonador e paga a cota pelas páginas que leva, como os jobs."""
+    import fitz
+    key = _preview_key(file_digest(src_pdf))
+    with _PREVIEW_LOCK:
+        known = _PREVIEW.get(key)
+    if known is None:
+        with fitz.open(src_pdf) as doc:
+            total = doc.page_count
+            layout = detect_layout(doc)
+        pool = _get_exec_pool()
+        step = max(PREVIEW_CHUNK, -(-total // EXEC_WORKERS))
+        futures = []
+        with paused_after(turns):
+            for j in range(0, total, step):
+                stop = min(j + step, total)
+                if turns is not None: turns.turn(cost=stop - j)
+                futures.append(pool.submit(_preview_range, src_pdf, j, stop, layout))
+        pages = []
+        for fut in futures:
+            chunk_layout, chunk = fut.result()
+            layout = layout or chunk_layout
+            pages.extend(chunk)
+        known = {
+            "layout": layout,
+            "names": [sanitize_filename(n) if n else None for n, _ in pages],
+            "confidence": [c for _, c in pages],
+        }
+        with _PREVIEW_LOCK:
+            _PREVIEW[key] = known
+            while len(_PREVIEW) > PREVIEW_CACHE:
+                _PREVIEW.popitem(last=False)
+        cached = False
+    else:
+        cached = True
+    base = os.path.splitext(os.path.basename(src_pdf))[0]
+    entries = []
+    for i, (name, confidence) in enumerate(zip(known["names"], known["confidence"])):
+        entry = {"page": i+1, "name": name or sanitize_filename(f"MANUAL_{base}_{i+1}"), "manual": not name}
+        if confidence is not None: entry["confidence"] = confidence
+        entries.append(entry)
+    manual = sum(1 for n in known["names"] if not n)
+    return {
+        "file": base, "pages": len(entries), "manual": manual,
+        "miss_rate": round(manual / len(entries), 4) if entries else 0.0,
+        "layout": known["layout"], "cached": cached, "entries": entries,
+    }
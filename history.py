@@ -0,0 +1,227 @@
+# history.py
+"""Histórico persistente de jobs em SQLite.
+
+Cada job encerrado (concluído, cancelado ou com erro) vira uma linha em
+``jobs``, uma por PDF em ``files`` e uma por página gerada em ``pages``, com o
+nome do funcionário normalizado (roster.normalize) e indexado — dá para
+achar os cartões de uma pessoa em todos os meses. Caminhos dos zips e das
+páginas ficam guardados, então os downloads sobrevivem a um restart.
+
+O mesmo índice serve de cadastro entre jobs: employees() lista os nomes e
+employee_pages() devolve as páginas já gravadas de uma pessoa em todos os
+meses, prontas para juntar num PDF ou zip sem reprocessar nada.
+
+A gravação sai do caminho do job: record() só tira uma fotografia do estado
+e a entrega a uma thread gravadora, que grava o job inteiro numa transação
+só (executemany). Leituras abrem conexões próprias (modo WAL).
+
+Configuração:
+  HISTORY_DB=data/historico.sqlite3   caminho do banco ("" desliga)
+"""
+import os, json, time, queue, threading
+from typing import List
+from roster import normalize
+
+HISTORY_DB = os.environ.get("HISTORY_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "historico.sqlite3"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY, client TEXT, status TEXT, layout TEXT,
+    created REAL, finished REAL, files INTEGER, pages INTEGER, renamed INTEGER, manual INTEGER,
+    artifacts TEXT
+);
+CREATE TABLE IF NOT EXISTS files (
+    job_id TEXT, file TEXT, pages INTEGER, renamed INTEGER, manual INTEGER, layout TEXT,
+    PRIMARY KEY (job_id, file)
+);
+CREATE TABLE IF NOT EXISTS pages (
+    job_id TEXT, file TEXT, page INTEGER, name TEXT, norm_name TEXT, output TEXT, path TEXT,
+    PRIMARY KEY (job_id, file, page)
+);
+CREATE INDEX IF NOT EXISTS jobs_created ON jobs (created DESC);
+CREATE INDEX IF NOT EXISTS pages_norm_name ON pages (norm_name, job_id);
+"""
+
+_queue: "queue.Queue[dict | None]" = queue.Queue()
+_writer: threading.Thread | None = None
+_lock = threading.Lock()
+_ready = threading.Event()
+
+def enabled() -> bool:
+    return bool(HISTORY_DB)
+
+def _connect():
+    import sqlite3
+    os.makedirs(os.path.dirname(HISTORY_DB) or ".", exist_ok=True)
+    conn = sqlite3.connect(HISTORY_DB, timeout=10, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def _run():
+    try:
+        conn = _connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+    except Exception:
+        return  # banco inacessível: histórico fica desligado nesta execução
+    finally:
+        _ready.set()
+    while True:
+        snap = _queue.get()
+        if snap is None:
+            return
+        try:
+            with conn:  # um job = uma transação
+                _write(conn, snap)
+        except Exception:
+            pass  # histórico é acessório: nunca derruba o job
+        finally:
+            _queue.task_done()
+
+def _write(conn, snap: dict):
+    job = snap["job"]
+    conn.execute("DELETE FROM files WHERE job_id = ?", (job["id"],))
+    conn.execute("DELETE FROM pages WHERE job_id = ?", (job["id"],))
+    conn.execute(
+        "INSERT OR REPLACE INTO jobs VALUES (:id, :client, :status, :layout, :created, :finished,"
+        " :files, :pages, :renamed, :manual, :artifacts)", job)
+    conn.executemany("INSERT INTO files VALUES (?, ?, ?, ?, ?, ?)", snap["files"])
+    conn.executemany("INSERT INTO pages VALUES (?, ?, ?, ?, ?, ?, ?)", snap["pages"])
+
+def _ensure_writer():
+    global _writer
+    with _lock:
+        if _writer is None:
+            _writer = threading.Thread(target=_run, name="history-writer", daemon=True)
+            _writer.start()
+    _ready.wait(10)
+
+def record(job_id: str, job: dict):
+    """Fotografa o job (chamado ao fim dele, ou depois de uma correção) e enfileira a gravação."""
+    if not enabled():
+        return
+    from core import JobStats, iter_pages
+    stats = job.get("stats")
+    if not isinstance(stats, JobStats):
+        return
+    root = os.path.join(job["out"], "arquivos_processados")
+    sources = job.get("artifact_sources") or {}
+    artifacts = {n: p for n, p in (job.get("artifacts") or {}).items() if n not in sources}
+    snap = {
+        "job": {
+            "id": job_id, "client": job.get("client"), "status": job.get("status"),
+            "layout": job.get("output_layout", "source"),
+            "created": job.get("created"), "finished": time.time(),
+            "files": len(stats.files), "pages": sum(f.pages for f in stats.files),
+            "renamed": stats.renamed, "manual": stats.manual,
+            "artifacts": json.dumps(artifacts, ensure_ascii=False),
+        },
+        "files": [(job_id, f.file, f.pages, f.renamed, f.manual, f.layout) for f in stats.files],
+        "pages": [
+            (job_id, fs.file, page, owner, normalize(owner) if owner else None, output, os.path.join(root, fs.file, output))
+            for fs, page, output, owner in iter_pages(stats)
+        ],
+    }
+    _ensure_writer()
+    if _writer.is_alive():
+        _queue.put(snap)
+
+def flush():
+    """Espera a fila de gravação esvaziar (testes e encerramento)."""
+    if _writer is not None:
+        _queue.join()
+
+def _page(rows, total: int, offset: int, limit: int) -> dict:
+    return {
+        "total": total, "offset": offset, "limit": limit, "items": rows,
+        "next": offset + limit if offset + limit < total else None,
+    }
+
+def _job_row(row) -> dict:
+    d = dict(row)
+    d["artifacts"] = json.loads(d["artifacts"] or "{}")
+    return d
+
+def list_jobs(offset: int = 0, limit: int = 20, name: str | None = None) -> dict:
+    """Jobs do mais recente para o mais antigo; com ``name``, só os que têm páginas de
+    funcionários cujo nome normalizado começa com ele (usa o índice pages_norm_name)."""
+    if not enabled() or not os.path.isfile(HISTORY_DB):
+        return _page([], 0, offset, limit)
+    conn = _connect()
+    try:
+        if name:
+            prefix = normalize(name)
+            match = "SELECT DISTINCT job_id FROM pages WHERE norm_name >= ? AND norm_name < ?"
+            args = (prefix, prefix + "\uffff")
+            total = conn.execute(f"SELECT COUNT(*) FROM ({match})", args).fetchone()[0]
+            rows = conn.execute(
+                f"SELECT jobs.*, (SELECT COUNT(*) FROM pages p WHERE p.job_id = jobs.id AND p.norm_name >= ? AND p.norm_name < ?) AS matches"
+                f" FROM jobs WHERE id IN ({match}) ORDER BY created DESC LIMIT ? OFFSET ?",
+                args + args + (limit, offset)).fetchall()
+        else:
+            total = conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+            rows = conn.execute("SELECT * FROM jobs ORDER BY created DESC LIMIT ? OFFSET ?", (limit, offset)).fetchall()
+        return _page([_job_row(r) for r in rows], total, offset, limit)
+    finally:
+        conn.close()
+
+def job_pages(job_id: str, name: str | None = None) -> List[dict]:
+    if not enabled() or not os.path.isfile(HISTORY_DB):
+        return []
+    conn = _connect()
+    try:
+        sql, args = "SELECT file, page, name, output FROM pages WHERE job_id = ?", (job_id,)
+        if name:
+            prefix = normalize(name)
+            sql, args = sql + " AND norm_name >= ? AND norm_name < ?", args + (prefix, prefix + "\uffff")
+        return [dict(r) for r in conn.execute(sql + " ORDER BY file, page", args)]
+    finally:
+        conn.close()
+
+def employees(name: str | None = None, offset: int = 0, limit: int = 50) -> dict:
+    """Funcionários com páginas no histórico (nome normalizado, páginas, jobs, último job);
+    ``name`` filtra por prefixo."""
+    if not enabled() or not os.path.isfile(HISTORY_DB):
+        return _page([], 0, offset, limit)
+    conn = _connect()
+    try:
+        where, args = "WHERE norm_name IS NOT NULL", ()
+        if name:
+            prefix = normalize(name)
+            where, args = "WHERE norm_name >= ? AND norm_name < ?", (prefix, prefix + "\uffff")
+        total = conn.execute(f"SELECT COUNT(DISTINCT norm_name) FROM pages {where}", args).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT norm_name, MIN(name) AS name, COUNT(*) AS pages, COUNT(DISTINCT job_id) AS jobs,"
+            f" MAX(jobs.created) AS last FROM pages JOIN jobs ON jobs.id = pages.job_id {where}"
+            f" GROUP BY norm_name ORDER BY norm_name LIMIT ? OFFSET ?",
+            args + (limit, offset)).fetchall()
+        return _page([dict(r) for r in rows], total, offset, limit)
+    finally:
+        conn.close()
+
+def employee_pages(name: str) -> List[dict]:
+    """Páginas gravadas de um funcionário (nome exato, normalizado), do job mais antigo ao
+    mais recente; ``available`` diz se o arquivo da página ainda está no disco."""
+    if not enabled() or not os.path.isfile(HISTORY_DB):
+        return []
+    conn = _connect()
+    try:
+        rows = conn.execute(
+            "SELECT pages.job_id, jobs.created, pages.file, pages.page, pages.name, pages.output, pages.path"
+            " FROM pages JOIN jobs ON jobs.id = pages.job_id WHERE pages.norm_name = ?"
+            " ORDER BY jobs.created, pages.job_id, pages.file, pages.page", (normalize(name),)).fetchall()
+    finally:
+        conn.close()
+    return [dict(r, available=os.path.isfile(r["path"])) for r in rows]
+
+def artifact_path(job_id: str, name: str) -> str | None:
+    """Caminho de um zip de job antigo (fora da memória do servidor)."""
+    if not enabled() or not os.path.isfile(HISTORY_DB):
+        return None
+    conn = _connect()
+    try:
+        row = conn.execute("SELECT artifacts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    finally:
+        conn.close()
+    path = json.loads(row["artifacts"] or "{}").get(name) if row else None
+    return path if path and os.path.isfile(path) else None
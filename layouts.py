@@ -0,0 +1,124 @@
+# layouts.py
+"""Registro de layouts (modelos) de cartão ponto para extração de nome.
+
+Cada layout declara:
+  - ``name``: identificador;
+  - ``fingerprint``: regexes que TODAS devem casar no texto limpo da página
+    para o documento ser reconhecido como deste layout;
+  - ``header``: fração superior da página onde fica o nome (0..1); se
+    informada, a extração de texto fica restrita a essa faixa. Também é a
+    região usada pelo OCR;
+  - ``patterns``: regexes com o nome no grupo 1, tentadas no texto limpo;
+  - ``raw_fallback``: se true, repete os padrões no texto cru normalizado.
+
+O layout é detectado uma vez por documento e os padrões dele passam a ser
+tentados primeiro nas páginas seguintes (ver PatternMatcher). Layouts extras
+vêm de um JSON (lista de objetos com os campos acima), carregado na subida do
+servidor.
+"""
+import re, json
+from typing import List
+
+class Layout:
+    __slots__ = ("name", "fingerprint", "header", "patterns", "raw_fallback")
+
+    def __init__(self, name: str, fingerprint: List[str], patterns: List[str],
+                 header: float | None = None, raw_fallback: bool = False):
+        if not patterns:
+            raise ValueError(f"layout {name!r} sem patterns")
+        self.name = name
+        self.fingerprint = [re.compile(p) for p in fingerprint]
+        self.header = header
+        self.patterns = [re.compile(p) for p in patterns]
+        self.raw_fallback = raw_fallback
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "Layout":
+        return cls(d["name"], d.get("fingerprint", []), d["patterns"], d.get("header"), bool(d.get("raw_fallback")))
+
+    def matches(self, text_clean: str) -> bool:
+        return bool(self.fingerprint) and all(f.search(text_clean) for f in self.fingerprint)
+
+class LayoutRegistry:
+    def __init__(self, layouts: List[Layout]):
+        self.layouts = layouts
+
+    def detect(self, text_clean: str) -> Layout | None:
+        for layout in self.layouts:
+            if layout.matches(text_clean):
+                return layout
+        return None
+
+    def get(self, name: str | None) -> Layout | None:
+        return next((l for l in self.layouts if l.name == name), None)
+
+class PatternMatcher:
+    """Ordem adaptativa dos padrões para um documento.
+
+    Num mesmo PDF quase todas as páginas casam com o mesmo layout, então o
+    layout cujo padrão casou vai para o início da fila (move-to-front) e é o
+    primeiro tentado na página seguinte. Em caso de falha, a lista completa é
+    percorrida, como antes. Dentro de um layout a prioridade dos padrões é
+    mantida: o genérico ``EMPREGADO:`` casaria "CARGO" antes do específico.
+    Também conta acertos por padrão.
+    """
+    __slots__ = ("_groups", "hits", "misses", "attempts")
+
+    def __init__(self, registry: LayoutRegistry):
+        # (nome do layout, raw_fallback, [(rótulo, regex), ...]) na ordem do registro
+        self._groups = [
+            (l.name, l.raw_fallback, [(f"{l.name}[{i}]", p) for i, p in enumerate(l.patterns)])
+            for l in registry.layouts
+        ]
+        self.hits: dict = {}
+        self.misses = 0
+        self.attempts = 0
+
+    def pin(self, layout: Layout):
+        """Coloca os padrões do layout detectado à frente dos demais."""
+        self._groups.sort(key=lambda g: g[0] != layout.name)
+
+    def _hit(self, pos: int, label: str, m) -> str:
+        if pos:
+            self._groups.insert(0, self._groups.pop(pos))
+        self.hits[label] = self.hits.get(label, 0) + 1
+        return m.group(1).strip()
+
+    def extract(self, text_clean: str, text_raw: str | None = None) -> str | None:
+        for pos, (_, _, patterns) in enumerate(self._groups):
+            for label, p in patterns:
+                self.attempts += 1
+                m = p.search(text_clean)
+                if m:
+                    return self._hit(pos, label, m)
+        if text_raw:
+            raw_up = None
+            for pos, (_, raw_fallback, patterns) in enumerate(self._groups):
+                if not raw_fallback:
+                    continue
+                if raw_up is None:
+                    raw_up = re.sub(r'\s+', ' ', text_raw).strip().upper()
+                for label, p in patterns:
+                    self.attempts += 1
+                    m = p.search(raw_up)
+                    if m:
+                        return self._hit(pos, label, m)
+        self.misses += 1
+        return None
+
+    def to_dict(self) -> dict:
+        return {"hits": dict(self.hits), "misses": self.misses, "attempts": self.attempts}
+
+def load_registry(defaults: List[dict], path: str | None = None) -> LayoutRegistry:
+    """Layouts do arquivo (se existir) primeiro; um layout do arquivo com o mesmo
+    nome de um padrão o substitui."""
+    extra: List[dict] = []
+    if path:
+        try:
+            with open(path, encoding="utf-8") as f:
+                extra = json.load(f)
+        except FileNotFoundError:
+            extra = []
+    names = {d["name"] for d in extra}
+    merged = extra + [d for d in defaults if d["name"] not in names]
+    return LayoutRegistry([Layout.from_dict(d) for d in merged])
@@ -0,0 +1,91 @@
+# medir_import.py
+"""Mede o custo de importar o servidor (cold start no plano free do Render).
+
+Roda ``python -X importtime -c "import server"`` em processos novos, fica com
+a melhor de N rodadas e compara com o orçamento gravado em medir_import.json.
+
+  python medir_import.py            # mede e compara (sai com 1 se estourar)
+  python medir_import.py --write    # regrava o relatório de referência
+
+Falha se o tempo passar do orçamento ou se algum módulo pesado que deve ser
+carregado sob demanda (PyMuPDF) aparecer na importação.
+"""
+import os, re, sys, json, argparse, platform, subprocess
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+REPORT_PATH = os.path.join(BASE_DIR, "medir_import.json")
+TARGET = "server"
+# Só podem ser importados no primeiro uso (core.py/ocr.py)
+LAZY_MODULES = ("fitz", "pymupdf", "tarfile", "concurrent.futures.process")
+LINE_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+def measure_once() -> dict:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {TARGET}"],
+        cwd=BASE_DIR, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise SystemExit(proc.stderr)
+    modules, total_us = {}, 0
+    for line in proc.stderr.splitlines():
+        m = LINE_RE.match(line)
+        if not m:
+            continue
+        self_us, cum_us, indent, name = int(m.group(1)), int(m.group(2)), len(m.group(3)), m.group(4)
+        modules[name] = {"self_us": self_us, "cum_us": cum_us}
+        if indent == 1 and name == TARGET:
+            total_us = cum_us
+    return {"total_us": total_us, "modules": modules}
+
+def measure(runs: int) -> dict:
+    best = min((measure_once() for _ in range(runs)), key=lambda r: r["total_us"])
+    # Maiores custos agrupados por pacote de topo
+    packages: dict = {}
+    for name, t in best["modules"].items():
+        top = name.split(".")[0]
+        packages[top] = packages.get(top, 0) + t["self_us"]
+    top = sorted(packages.items(), key=lambda kv: kv[1], reverse=True)[:15]
+    return {
+        "python": platform.python_version(),
+        "total_ms": round(best["total_us"] / 1000, 1),
+        "modules": len(best["modules"]),
+        "lazy_violations": [m for m in LAZY_MODULES if m in best["modules"]],
+        "top_packages_ms": {k: round(v / 1000, 1) for k, v in top},
+    }
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--runs", type=int, default=5)
+    parser.add_argument("--write", action="store_true", help="grava o resultado como nova referência")
+    parser.add_argument("--budget-ms", type=float, help="orçamento ao usar --write (padrão: o atual)")
+    args = parser.parse_args(argv)
+
+    result = measure(max(1, args.runs))
+    try:
+        with open(REPORT_PATH, encoding="utf-8") as f: ref = json.load(f)
+    except FileNotFoundError:
+        ref = {}
+    budget = args.budget_ms or ref.get("budget_ms") or round(result["total_ms"] * 1.5)
+
+    print(f"import {TARGET}: {result['total_ms']} ms ({result['modules']} módulos), orçamento {budget} ms")
+    if ref.get("total_ms"):
+        print(f"referência: {ref['total_ms']} ms (Python {ref.get('python')})")
+    for name, ms in result["top_packages_ms"].items():
+        print(f"  {name:<24} {ms:>7} ms")
+
+    if args.write:
+        with open(REPORT_PATH, "w", encoding="utf-8") as f:
+            json.dump({"budget_ms": budget, **result}, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        return 0
+    failed = False
+    if result["lazy_violations"]:
+        print(f"ERRO: importados na subida: {', '.join(result['lazy_violations'])}", file=sys.stderr)
+        failed = True
+    if result["total_ms"] > budget:
+        print(f"ERRO: {result['total_ms']} ms acima do orçamento de {budget} ms", file=sys.stderr)
+        failed = True
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+# ocr.py
+"""OCR de fallback para páginas sem camada de texto (cartões escaneados).
+
+Só entra em ação quando os padrões de nome (PatternMatcher) não acham nada na
+camada de texto: renderiza apenas o cabeçalho da página em DPI baixo, roda o
+Tesseract num pool de processos com limite de concorrência e guarda o
+resultado por hash da imagem, então páginas repetidas não pagam o OCR de novo.
+
+Opcional: exige ``pytesseract`` + ``Pillow`` e o binário ``tesseract`` no PATH.
+Ativado com OCR_ENABLED=true; sem as dependências o estágio fica desligado.
+"""
+import os, io, time, shutil, hashlib, threading
+from collections import OrderedDict
+from concurrent.futures import TimeoutError as FutureTimeout
+
+OCR_ENABLED = os.environ.get("OCR_ENABLED", "false").lower() == "true"
+OCR_WORKERS = max(1, int(os.environ.get("OCR_WORKERS", "2")))
+OCR_DPI = int(os.environ.get("OCR_DPI", "120"))
+OCR_LANG = os.environ.get("OCR_LANG", "por")
+OCR_TIMEOUT = float(os.environ.get("OCR_TIMEOUT", "30"))
+# Fração superior da página onde ficam empregador/empregado no cartão ponto
+OCR_HEADER_FRACTION = float(os.environ.get("OCR_HEADER_FRACTION", "0.3"))
+OCR_CACHE_SIZE = 1024
+
+_pool = None  # ProcessPoolExecutor, criado no primeiro OCR
+_pool_lock = threading.Lock()
+_cache: "OrderedDict[str, str]" = OrderedDict()
+_cache_lock = threading.Lock()
+_available: bool | None = None
+
+def available() -> bool:
+    """OCR ligado por configuração e com engine instalada (verificado uma vez)."""
+    global _available
+    if not OCR_ENABLED:
+        return False
+    if _available is None:
+        try:
+            import pytesseract, PIL  # noqa: F401
+            _available = shutil.which("tesseract") is not None
+        except ImportError:
+            _available = False
+    return _available
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            # spawn: os workers importam só este módulo, sem herdar threads do servidor
+            _pool = ProcessPoolExecutor(max_workers=OCR_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+def shutdown():
+    """Descarta a fila e espera os workers saírem (fim do servidor ou do CLI)."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+def _run_engine(png: bytes, lang: str) -> str:
+    # Executa no processo worker
+    import pytesseract
+    from PIL import Image
+    return pytesseract.image_to_string(Image.open(io.BytesIO(png)), lang=lang) or ""
+
+def render_header(page, fraction: float | None = None) -> bytes:
+    """PNG em tons de cinza só do cabeçalho; o chamador precisa segurar o lock do documento."""
+    import fitz
+    r = page.rect
+    clip = fitz.Rect(r.x0, r.y0, r.x1, r.y0 + r.height * (fraction or OCR_HEADER_FRACTION))
+    pix = page.get_pixmap(dpi=OCR_DPI, clip=clip, colorspace=fitz.csGRAY)
+    return pix.tobytes("png")
+
+class OcrTask:
+    """OCR de um cabeçalho já enviado ao pool (ou resolvido pelo cache).
+    Várias tarefas podem estar no ar ao mesmo tempo; wait() colhe o texto."""
+    __slots__ = ("key", "text", "fut", "deadline")
+
+    def __init__(self, key: str, text: str | None = None, fut=None):
+        self.key = key
+        self.text = text
+        self.fut = fut
+        self.deadline = time.monotonic() + OCR_TIMEOUT
+
+    def wait(self, cancelled=None) -> str | None:
+        """Texto do OCR, ou None se falhou, estourou OCR_TIMEOUT ou foi cancelado.
+        ``cancelled`` (função sem argumentos) é consultada enquanto espera o worker."""
+        if self.fut is None:
+            return self.text
+        fut, self.fut = self.fut, None
+        try:
+            while True:
+                try:
+                    self.text = fut.result(timeout=min(0.2, max(0.0, self.deadline - time.monotonic())))
+                    break
+                except FutureTimeout:
+                    if time.monotonic() >= self.deadline or (cancelled is not None and cancelled()):
+                        fut.cancel()  # ainda na fila: nem chega a rodar
+                        return None
+        except Exception:
+            return None
+        with _cache_lock:
+            _cache[self.key] = self.text
+            while len(_cache) > OCR_CACHE_SIZE:
+                _cache.popitem(last=False)
+        return self.text
+
+    def cancel(self):
+        if self.fut is not None:
+            self.fut.cancel()
+            self.fut = None
+
+def submit(page, fraction: float | None = None) -> OcrTask | None:
+    """Renderiza o cabeçalho (na thread do chamador, que segura o documento) e envia o
+    OCR ao pool sem esperar; None se o OCR está indisponível."""
+    if not available():
+        return None
+    png = render_header(page, fraction)
+    key = hashlib.sha1(png).hexdigest()
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return OcrTask(key, _cache[key])
+    try:
+        return OcrTask(key, fut=_get_pool().submit(_run_engine, png, OCR_LANG))
+    except Exception:
+        return None
@@ -0,0 +1,120 @@
+# roster.py
+"""Cadastro de funcionários (CSV) indexado por trigramas.
+
+Nomes extraídos da página (com ruído de OCR ou layout levemente diferente) são
+"encaixados" no nome mais próximo do cadastro. O índice invertido trigrama →
+funcionários limita a comparação aos candidatos que compartilham trigramas, e a
+pontuação é o coeficiente de Dice entre os conjuntos de trigramas (0..1).
+
+Com limiar (snap), a busca usa filtro de prefixo: um nome com Dice ≥ t divide
+pelo menos k trigramas com o candidato, então basta percorrer as listas dos
+n−k+1 trigramas mais raros dele. Trigramas comuns (" DA", "DA ", "SIL"), que
+puxariam quase o cadastro todo, ficam de fora; a faixa de tamanho descarta o
+resto antes da pontuação, que conta os trigramas em comum por AND de
+máscaras de bits (um bit por trigrama do cadastro).
+"""
+import os, io, csv, math, unicodedata
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+ROSTER_MIN_SCORE = float(os.environ.get("ROSTER_MIN_SCORE", "0.72"))
+NAME_COLUMNS = ("NOME", "NAME", "EMPREGADO", "FUNCIONARIO", "COLABORADOR")
+
+def normalize(name: str) -> str:
+    """Maiúsculas, sem acentos e com espaços colapsados (chave de comparação)."""
+    s = unicodedata.normalize("NFKD", name.upper())
+    s = "".join(ch for ch in s if not unicodedata.combining(ch))
+    s = "".join(ch if "A" <= ch <= "Z" else " " for ch in s)
+    return " ".join(s.split())
+
+def trigrams(norm: str) -> frozenset:
+    padded = f"  {norm} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+class RosterIndex:
+    def __init__(self, names):
+        self.names: List[str] = []
+        self._keys: Dict[str, int] = {}
+        self._sizes: List[int] = []
+        self._masks: List[int] = []
+        self._bits: Dict[str, int] = {}
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+        for name in names:
+            display = " ".join(name.upper().split())
+            key = normalize(display)
+            if len(key.split()) < 2 or key in self._keys:
+                continue
+            idx = len(self.names)
+            self.names.append(display)
+            self._keys[key] = idx
+            grams = trigrams(key)
+            self._sizes.append(len(grams))
+            mask = 0
+            for g in grams:
+                self._postings[g].append(idx)
+                mask |= 1 << self._bits.setdefault(g, len(self._bits))
+            self._masks.append(mask)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @classmethod
+    def from_csv(cls, data: bytes) -> "RosterIndex":
+        text = data.decode("utf-8-sig", errors="replace")
+        try:
+            dialect = csv.Sniffer().sniff(text[:4096], delimiters=";,\t")
+        except csv.Error:
+            dialect = csv.excel
+        rows = list(csv.reader(io.StringIO(text), dialect))
+        if not rows:
+            return cls([])
+        header = [normalize(c) for c in rows[0]]
+        col = next((header.index(c) for c in NAME_COLUMNS if c in header), None)
+        if col is None:
+            col, body = 0, rows  # sem cabeçalho reconhecido: primeira coluna, todas as linhas
+        else:
+            body = rows[1:]
+        return cls(r[col] for r in body if len(r) > col and r[col].strip())
+
+    def match(self, candidate: str, min_score: float = 0.0) -> Tuple[str, float] | None:
+        """Nome do cadastro mais parecido e a pontuação (0..1). Com ``min_score``, só
+        nomes que podem alcançá-lo são examinados (um resultado abaixo dele é aproximado)."""
+        key = normalize(candidate)
+        if not key:
+            return None
+        exact = self._keys.get(key)
+        if exact is not None:
+            return self.names[exact], 1.0
+        grams = trigrams(key)
+        n = len(grams)
+        if min_score > 0:
+            # Dice ≥ t exige ao menos k = ⌈t·n/(2−t)⌉ trigramas em comum e tamanho na faixa
+            t = min(min_score, 1.0)
+            k = max(1, math.ceil(t * n / (2 - t) - 1e-9))
+            lo, hi = t * n / (2 - t) - 1e-9, (2 - t) * n / t + 1e-9
+            rare = sorted(grams, key=lambda g: len(self._postings.get(g, ())))[:n - k + 1]
+            cands = {idx for g in rare for idx in self._postings.get(g, ()) if lo <= self._sizes[idx] <= hi}
+            qmask = 0
+            for g in grams:
+                bit = self._bits.get(g)
+                if bit is not None: qmask |= 1 << bit
+            masks, sizes = self._masks, self._sizes
+            scored = [(idx, 2.0 * (qmask & masks[idx]).bit_count() / (n + sizes[idx])) for idx in cands]
+        else:
+            overlap: Dict[int, int] = defaultdict(int)
+            for g in grams:
+                for idx in self._postings.get(g, ()):
+                    overlap[idx] += 1
+            scored = [(idx, 2.0 * c / (n + self._sizes[idx])) for idx, c in overlap.items()]
+        if not scored:
+            return None
+        best, score = max(scored, key=lambda t: t[1])
+        return self.names[best], round(score, 3)
+
+    def snap(self, candidate: str) -> Tuple[str | None, float]:
+        """(nome do cadastro, confiança); nome None quando abaixo de ROSTER_MIN_SCORE."""
+        hit = self.match(candidate, ROSTER_MIN_SCORE)
+        if hit is None:
+            return None, 0.0
+        name, score = hit
+        return (name if score >= ROSTER_MIN_SCORE else None), score
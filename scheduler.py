@@ -0,0 +1,270 @@
+# scheduler.py
+"""Escalonamento justo de páginas entre clientes do servidor.
+
+Cada job roda na sua thread, mas só processa uma página quando recebe a vez:
+há SCHED_SLOTS vagas de página, distribuídas entre os clientes (chave de API
+ou IP) por round-robin ponderado suave — um departamento com 50 PDFs grandes
+ocupa só a sua fatia e um job pequeno de outro cliente entra na frente na
+página seguinte. Dentro de um cliente, os jobs se revezam na ordem de chegada.
+
+Cotas opcionais de páginas por minuto (balde de fichas) deixam o cliente fora
+da disputa até recarregar, sem recusar o job. Uma vez pode valer várias
+páginas (cost): o estágio de gravação do modo plano pede uma vez por bloco
+enviado ao pool e paga o bloco inteiro — o saldo pode ficar negativo, e a
+dívida atrasa a vez seguinte do cliente. O tempo de espera por página é
+registrado por cliente e exposto em snapshot() (ver /api/metrics).
+
+Além das vagas de página há um limite de jobs em andamento (admissão): o job
+excedente espera como "queued", e a vaga vai para o cliente com menos jobs
+rodando. Os dois limites podem ser mudados em tempo de execução (resize), o
+que o controller.py faz conforme memória e CPU.
+
+Configuração:
+  SCHED_SLOTS=4                     páginas simultâneas (padrão: nº de CPUs)
+  SCHED_JOBS=4                      jobs em andamento (padrão: 0 = sem limite)
+  SCHED_WEIGHTS="rh=3,10.0.0.7=1"   peso por cliente (padrão 1)
+  SCHED_QUOTAS="rh=600"             páginas/minuto por cliente
+  SCHED_DEFAULT_PPM=0               cota dos demais (0 = sem cota)
+"""
+import os, time, threading
+from collections import deque
+from typing import Callable, Dict
+
+WAIT_SAMPLES = 512
+
+def _parse_map(spec: str) -> Dict[str, float]:
+    out = {}
+    for item in filter(None, (s.strip() for s in spec.split(","))):
+        key, _, val = item.rpartition("=")
+        if key:
+            out[key.strip()] = float(val)
+    return out
+
+class _Client:
+    __slots__ = ("name", "weight", "ppm", "tokens", "refilled", "current", "waiters",
+                 "active", "running", "pages", "wait_total", "wait_max", "waits")
+
+    def __init__(self, name: str, weight: float, ppm: float):
+        self.name = name
+        self.weight = max(weight, 0.01)
+        self.ppm = ppm
+        self.tokens = ppm  # balde começa cheio: rajada de até 1 minuto de cota
+        self.refilled = time.monotonic()
+        self.current = 0.0  # estado do round-robin ponderado suave
+        self.waiters: deque = deque()
+        self.active = 0
+        self.running = 0  # jobs admitidos
+        self.pages = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.waits: deque = deque(maxlen=WAIT_SAMPLES)
+
+    def refill(self, now: float):
+        if self.ppm > 0:
+            self.tokens = min(self.ppm, self.tokens + (now - self.refilled) * self.ppm / 60.0)
+        self.refilled = now
+
+    def eligible(self) -> bool:
+        # Bloco maior que a cota inteira: basta o balde cheio, senão nunca entraria
+        return bool(self.waiters) and (self.ppm <= 0 or self.tokens >= min(self.waiters[0].cost, self.ppm))
+
+class _Ticket:
+    __slots__ = ("granted", "since", "client", "cost")
+
+    def __init__(self, client: str = "", cost: int = 1):
+        self.granted = False
+        self.since = time.monotonic()
+        self.client = client
+        self.cost = max(1, cost)
+
+class FairScheduler:
+    def __init__(self, slots: int, weights: Dict[str, float] | None = None,
+                 quotas: Dict[str, float] | None = None, default_ppm: float = 0.0, jobs: int = 0):
+        self.slots = max(1, slots)
+        self.busy = 0
+        self.job_slots = jobs if jobs > 0 else None
+        self.jobs_running = 0
+        self._job_queue: deque = deque()
+        self.weights = weights or {}
+        self.quotas = quotas or {}
+        self.default_ppm = default_ppm
+        self._cond = threading.Condition()
+        self._clients: Dict[str, _Client] = {}
+
+    @classmethod
+    def from_env(cls) -> "FairScheduler":
+        return cls(
+            int(os.environ.get("SCHED_SLOTS", "0")) or (os.cpu_count() or 2),
+            _parse_map(os.environ.get("SCHED_WEIGHTS", "")),
+            _parse_map(os.environ.get("SCHED_QUOTAS", "")),
+            float(os.environ.get("SCHED_DEFAULT_PPM", "0")),
+            int(os.environ.get("SCHED_JOBS", "0")),
+        )
+
+    def _client(self, name: str) -> _Client:
+        c = self._clients.get(name)
+        if c is None:
+            c = self._clients[name] = _Client(name, self.weights.get(name, 1.0), self.quotas.get(name, self.default_ppm))
+        return c
+
+    def _dispatch(self):
+        # Chamado com o lock: entrega vagas livres pelo round-robin ponderado suave (nginx)
+        now = time.monotonic()
+        while self.busy < self.slots:
+            ready = []
+            for c in self._clients.values():
+                c.refill(now)
+                if c.eligible():
+                    ready.append(c)
+            if not ready:
+                return
+            total = sum(c.weight for c in ready)
+            for c in ready:
+                c.current += c.weight
+            best = max(ready, key=lambda c: c.current)
+            best.current -= total
+            ticket = best.waiters.popleft()
+            ticket.granted = True
+            if best.ppm > 0:
+                best.tokens -= ticket.cost
+            waited = now - ticket.since
+            best.pages += ticket.cost
+            best.wait_total += waited
+            best.wait_max = max(best.wait_max, waited)
+            best.waits.append(waited)
+            self.busy += 1
+            self._cond.notify_all()
+
+    def acquire(self, client: str, cancelled: Callable[[], bool] | None = None, cost: int = 1) -> float | None:
+        """Espera a vez de processar ``cost`` páginas; devolve a espera em segundos ou None se cancelado."""
+        ticket = _Ticket(cost=cost)
+        with self._cond:
+            c = self._client(client)
+            c.waiters.append(ticket)
+            self._dispatch()
+            while not ticket.granted:
+                # Timeout curto: recarga das cotas e cancelamento não têm notificação própria
+                self._cond.wait(0.25)
+                if not ticket.granted and cancelled is not None and cancelled():
+                    c.waiters.remove(ticket)
+                    return None
+                self._dispatch()
+        return time.monotonic() - ticket.since
+
+    def release(self):
+        with self._cond:
+            self.busy -= 1
+            self._dispatch()
+
+    def _admit_jobs(self):
+        # Chamado com o lock: vaga de job para o cliente com menos jobs rodando (desempate: o mais antigo)
+        while self._job_queue and (self.job_slots is None or self.jobs_running < self.job_slots):
+            ticket = min(self._job_queue, key=lambda t: (self._clients[t.client].running, t.since))
+            self._job_queue.remove(ticket)
+            ticket.granted = True
+            self._clients[ticket.client].running += 1
+            self.jobs_running += 1
+            self._cond.notify_all()
+
+    def admit(self, client: str, cancelled: Callable[[], bool] | None = None) -> bool:
+        """Espera vaga de job; False se cancelado antes de começar."""
+        ticket = _Ticket(client)
+        with self._cond:
+            self._client(client)
+            self._job_queue.append(ticket)
+            self._admit_jobs()
+            while not ticket.granted:
+                self._cond.wait(0.25)
+                if not ticket.granted and cancelled is not None and cancelled():
+                    self._job_queue.remove(ticket)
+                    return False
+        return True
+
+    def leave(self, client: str):
+        with self._cond:
+            self._clients[client].running -= 1
+            self.jobs_running -= 1
+            self._admit_jobs()
+
+    def resize(self, slots: int | None = None, jobs: int | None = None):
+        with self._cond:
+            if slots is not None:
+                self.slots = max(1, slots)
+            if jobs is not None:
+                self.job_slots = max(1, jobs)
+            self._dispatch()
+            self._admit_jobs()
+
+    def demand(self) -> dict:
+        """Pressão atual: páginas e jobs esperando vaga (usado pelo controller)."""
+        with self._cond:
+            return {
+                "slots": self.slots, "busy": self.busy,
+                "waiting_pages": sum(len(c.waiters) for c in self._clients.values()),
+                "jobs": self.job_slots, "jobs_running": self.jobs_running, "waiting_jobs": len(self._job_queue),
+            }
+
+    def turns(self, client: str) -> "PageTurns":
+        return PageTurns(self, client)
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            clients = {}
+            for c in self._clients.values():
+                waits = sorted(c.waits)
+                clients[c.name] = {
+                    "weight": c.weight, "ppm": c.ppm or None,
+                    "active_jobs": c.active, "running_jobs": c.running, "waiting_pages": len(c.waiters), "pages": c.pages,
+                    "queue_wait_ms": {
+                        "avg": round(1000 * c.wait_total / c.pages, 1) if c.pages else 0.0,
+                        "p95": round(1000 * waits[int(0.95 * (len(waits) - 1))], 1) if waits else 0.0,
+                        "max": round(1000 * c.wait_max, 1),
+                    },
+                }
+            return {
+                "slots": self.slots, "busy": self.busy,
+                "jobs": {"limit": self.job_slots, "running": self.jobs_running, "waiting": len(self._job_queue)},
+                "clients": clients,
+            }
+
+class PageTurns:
+    """Vez de página de um job: turn() devolve a vaga da página anterior e espera a
+    próxima; pause() devolve a vaga entre arquivos; close() no fim do job."""
+    __slots__ = ("sched", "client", "holding", "admitted", "waited")
+
+    def __init__(self, sched: FairScheduler, client: str):
+        self.sched = sched
+        self.client = client
+        self.holding = False
+        self.admitted = False
+        self.waited = 0.0
+        with sched._cond:
+            sched._client(client).active += 1
+
+    def admit(self, cancelled: Callable[[], bool] | None = None) -> bool:
+        t0 = time.monotonic()
+        self.admitted = self.sched.admit(self.client, cancelled)
+        self.waited += time.monotonic() - t0
+        return self.admitted
+
+    def turn(self, cancelled: Callable[[], bool] | None = None, cost: int = 1) -> bool:
+        self.pause()
+        waited = self.sched.acquire(self.client, cancelled, cost)
+        if waited is None:
+            return False
+        self.waited += waited
+        self.holding = True
+        return True
+
+    def pause(self):
+        if self.holding:
+            self.holding = False
+            self.sched.release()
+
+    def close(self):
+        self.pause()
+        if self.admitted:
+            self.admitted = False
+            self.sched.leave(self.client)
+        with self.sched._cond:
+            self.sched._client(self.client).active -= 1
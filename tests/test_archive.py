@@ -0,0 +1,91 @@
+import io, os, tarfile, zipfile
+import pytest
+import archive
+
+PDF = b"%PDF-1.4\n" + os.urandom(4096) + b"\n%%EOF\n"
+
+class Unseekable(io.RawIOBase):
+    """Destino só de escrita: o zipfile grava as entradas com data descriptor."""
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.data += b
+        return len(b)
+
+def extract(data: bytes, dest) -> list:
+    return [os.path.relpath(p, dest) for p in archive.extract_pdfs(io.BytesIO(data), str(dest))]
+
+def zip_bytes(entries, compression=zipfile.ZIP_DEFLATED) -> bytes:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", compression=compression) as zf:
+        for name, data in entries:
+            zf.writestr(name, data)
+    return buf.getvalue()
+
+@pytest.mark.parametrize("compression", [zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED])
+def test_zip_keeps_only_pdfs_and_dedupes_names(tmp_path, compression):
+    data = zip_bytes([
+        ("jan/ponto.pdf", PDF), ("fev/ponto.PDF", PDF[::-1]), ("leia.txt", b"oi"),
+        ("__MACOSX/jan/._ponto.pdf", b"x"), ("jan/", b""),
+    ], compression)
+    assert extract(data, tmp_path) == ["ponto.pdf", "ponto_2.PDF"]
+    assert (tmp_path / "ponto.pdf").read_bytes() == PDF
+    assert (tmp_path / "ponto_2.PDF").read_bytes() == PDF[::-1]
+
+def test_streamed_zip_with_data_descriptor(tmp_path):
+    out = Unseekable()
+    with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for name in ("a.pdf", "b.pdf"):
+            with zf.open(name, "w") as f:
+                f.write(PDF)
+    assert extract(bytes(out.data), tmp_path) == ["a.pdf", "b.pdf"]
+    assert (tmp_path / "b.pdf").read_bytes() == PDF
+
+def test_tar_gz(tmp_path):
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w:gz") as tf:
+        for name, data in (("dir/a.pdf", PDF), ("dir/b.txt", b"oi")):
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tf.addfile(info, io.BytesIO(data))
+    assert extract(buf.getvalue(), tmp_path) == ["a.pdf"]
+    assert (tmp_path / "a.pdf").read_bytes() == PDF
+
+def test_empty_body_yields_nothing(tmp_path):
+    assert extract(b"", tmp_path) == []
+
+def test_junk_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        extract(b"garbage" * 100, tmp_path)
+    assert os.listdir(tmp_path) == []
+
+def test_corrupt_entry_leaves_no_partial_file(tmp_path):
+    data = bytearray(zip_bytes([("a.pdf", PDF), ("b.pdf", PDF)], zipfile.ZIP_STORED))
+    second = data.index(b"PK\x03\x04", 4)
+    data[second + 30 + len("b.pdf") + 100] ^= 0xFF  # byte no meio dos dados de b.pdf
+    got = []
+    with pytest.raises(ValueError, match="CRC"):
+        for path in archive.extract_pdfs(io.BytesIO(bytes(data)), str(tmp_path)):
+            got.append(os.path.basename(path))
+    assert got == ["a.pdf"]
+    assert sorted(os.listdir(tmp_path)) == ["a.pdf"]
+
+def test_chunk_reader_feeds_the_extractor(tmp_path):
+    import threading
+    data = zip_bytes([("a.pdf", PDF)])
+    reader = archive.ChunkReader(maxsize=4)
+
+    def feed():
+        for i in range(0, len(data), 1000):
+            reader.feed(data[i:i + 1000])
+        reader.finish()
+    t = threading.Thread(target=feed)
+    t.start()
+    paths = list(archive.extract_pdfs(reader, str(tmp_path)))
+    t.join()
+    assert [os.path.basename(p) for p in paths] == ["a.pdf"]
@@ -0,0 +1,77 @@
+import queue, threading
+import pytest
+import history
+from core import FileStats, JobStats
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    # Banco e thread gravadora próprios por teste
+    monkeypatch.setattr(history, "HISTORY_DB", str(tmp_path / "historico.sqlite3"))
+    monkeypatch.setattr(history, "_writer", None)
+    monkeypatch.setattr(history, "_queue", queue.Queue())
+    monkeypatch.setattr(history, "_ready", threading.Event())
+    yield tmp_path
+    history._queue.put(None)
+
+def make_job(tmp_path, created: float, outputs: dict, manual: dict | None = None) -> dict:
+    stats = JobStats()
+    for file, names in outputs.items():
+        fs = FileStats(file, len(names))
+        fs.outputs = list(names)
+        for page in (manual or {}).get(file, ()):
+            fs.manual_pages.append(page)
+            fs.manual += 1
+        fs.renamed = sum(1 for n in names if n) - fs.manual
+        stats.files.append(fs)
+    return {"out": str(tmp_path), "stats": stats, "created": created, "status": "finished", "client": "rh", "in": ["x.pdf"]}
+
+def test_list_jobs_newest_first_with_pagination(db):
+    for n in range(3):
+        history.record(f"job{n}", make_job(db, created=100.0 + n, outputs={"a": ["FULANO.pdf"]}))
+    history.flush()
+
+    first = history.list_jobs(offset=0, limit=2)
+    assert first["total"] == 3
+    assert [j["id"] for j in first["items"]] == ["job2", "job1"]
+    assert first["next"] == 2
+    assert first["items"][0]["pages"] == 1 and first["items"][0]["renamed"] == 1
+
+    last = history.list_jobs(offset=2, limit=2)
+    assert [j["id"] for j in last["items"]] == ["job0"]
+    assert last["next"] is None
+
+def test_record_replaces_a_job_recorded_again(db):
+    history.record("job", make_job(db, 1.0, {"a": ["FULANO.pdf", "MANUAL_a_2.pdf"]}, manual={"a": [2]}))
+    history.record("job", make_job(db, 1.0, {"a": ["FULANO.pdf", "CICLANO.pdf"]}))
+    history.flush()
+
+    assert history.list_jobs()["total"] == 1
+    assert [p["name"] for p in history.job_pages("job")] == ["FULANO", "CICLANO"]
+
+def test_employees_search_across_jobs(db):
+    history.record("jan", make_job(db, 1.0, {"jan": ["JOÃO SILVA.pdf", "MARIA SOUZA.pdf", "MANUAL_jan_3.pdf"]},
+                                   manual={"jan": [3]}))
+    history.record("fev", make_job(db, 2.0, {"fev": ["JOÃO SILVA.pdf", "JOÃO SILVA_1.pdf", None]}))
+    history.flush()
+
+    page = history.employees(limit=1)
+    assert page["total"] == 2  # páginas MANUAL e não gravadas ficam de fora
+    assert page["next"] == 1
+    joao = page["items"][0]
+    assert (joao["norm_name"], joao["pages"], joao["jobs"]) == ("JOAO SILVA", 3, 2)
+    assert [e["norm_name"] for e in history.employees(offset=1, limit=1)["items"]] == ["MARIA SOUZA"]
+    assert [e["norm_name"] for e in history.employees(name="mar")["items"]] == ["MARIA SOUZA"]
+
+    by_name = history.list_jobs(name="joao")
+    assert [(j["id"], j["matches"]) for j in by_name["items"]] == [("fev", 2), ("jan", 1)]
+
+    pages = history.employee_pages("João Silva")
+    assert [(p["job_id"], p["output"]) for p in pages] == [("jan", "JOÃO SILVA.pdf"), ("fev", "JOÃO SILVA.pdf"), ("fev", "JOÃO SILVA_1.pdf")]
+    assert not any(p["available"] for p in pages)
+
+def test_disabled_history_records_nothing(tmp_path, monkeypatch):
+    monkeypatch.setattr(history, "HISTORY_DB", "")
+    history.record("job", make_job(tmp_path, 1.0, {"a": ["FULANO.pdf"]}))
+    history.flush()
+    assert history.list_jobs()["total"] == 0
+    assert history.employees()["items"] == []
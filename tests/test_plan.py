@@ -0,0 +1,21 @@
+import pytest
+from core import JOBS, apply_plan_changes
+
+@pytest.fixture
+def planned():
+    entries = [{"page": 1, "name": "FULANO", "manual": False, "output": "FULANO.pdf"},
+               {"page": 2, "name": "MANUAL_a_2", "manual": True, "output": "MANUAL_a_2.pdf"}]
+    JOBS["plano"] = {"plan": [{"file": "a", "src": "a.pdf", "entries": entries}]}
+    yield entries
+    JOBS.pop("plano", None)
+
+def test_apply_plan_changes_renames_and_reassigns_outputs(planned):
+    assert apply_plan_changes("plano", [{"file": "a", "page": 2, "name": "FULANO"}]) == 1
+    assert [(e["name"], e["manual"], e["output"]) for e in planned] == [
+        ("FULANO", False, "FULANO.pdf"), ("FULANO", False, "FULANO_1.pdf")]
+
+@pytest.mark.parametrize("name", ["", "   ", "///", None])
+def test_apply_plan_changes_rejects_blank_names(planned, name):
+    with pytest.raises(ValueError, match="nome vazio"):
+        apply_plan_changes("plano", [{"file": "a", "page": 1, "name": "OK"}, {"file": "a", "page": 2, "name": name}])
+    assert [e["name"] for e in planned] == ["FULANO", "MANUAL_a_2"]
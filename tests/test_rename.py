@@ -0,0 +1,104 @@
+import io, os, zipfile
+import pytest
+import archive, core
+from core import FileStats, JobStats, JOBS, make_zip, rename_outputs
+
+def zip_contents(path) -> dict:
+    with zipfile.ZipFile(path) as zf:
+        assert zf.testzip() is None
+        return {i.filename: zf.read(i) for i in zf.infolist()}
+
+def test_repack_zip_renames_without_recompressing(tmp_path):
+    src, dst = tmp_path / "a.zip", tmp_path / "b.zip"
+    with zipfile.ZipFile(src, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("a/FULANO.pdf", b"fulano" * 500)
+        zf.writestr("a/MANUAL_a_2.pdf", b"manual" * 500)
+        zf.writestr("b/outro.pdf", b"outro", compress_type=zipfile.ZIP_STORED)
+    assert archive.repack_zip(str(src), str(dst), {"a/MANUAL_a_2.pdf": "a/JOÃO.pdf"}) == 1
+    assert zip_contents(dst) == {"a/FULANO.pdf": b"fulano" * 500, "a/JOÃO.pdf": b"manual" * 500, "b/outro.pdf": b"outro"}
+    with zipfile.ZipFile(src) as a, zipfile.ZipFile(dst) as b:
+        assert [(i.compress_type, i.compress_size, i.CRC) for i in a.infolist()] == \
+               [(i.compress_type, i.compress_size, i.CRC) for i in b.infolist()]
+        assert b.getinfo("a/JOÃO.pdf").flag_bits & 0x800  # nome em UTF-8
+
+def test_repack_zip_drops_data_descriptors(tmp_path):
+    class Unseekable(io.RawIOBase):
+        def __init__(self): self.data = bytearray()
+        def writable(self): return True
+        def write(self, b): self.data += b; return len(b)
+    out = Unseekable()
+    with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        with zf.open("x.pdf", "w") as f:
+            f.write(b"x" * 1000)
+    src, dst = tmp_path / "a.zip", tmp_path / "b.zip"
+    src.write_bytes(bytes(out.data))
+    archive.repack_zip(str(src), str(dst), {"x.pdf": "y.pdf"})
+    assert zip_contents(dst) == {"y.pdf": b"x" * 1000}
+    with zipfile.ZipFile(dst) as zf:
+        assert not zf.getinfo("y.pdf").flag_bits & 0x8
+
+@pytest.fixture
+def job(tmp_path):
+    # Job concluído com uma página nomeada e uma MANUAL, zip no layout padrão
+    root = tmp_path / "arquivos_processados" / "a"
+    root.mkdir(parents=True)
+    outputs = ["FULANO.pdf", "MANUAL_a_2.pdf"]
+    for n in outputs:
+        (root / n).write_bytes(n.encode() * 100)
+    fs = FileStats("a", 2)
+    fs.outputs = list(outputs)
+    fs.renamed, fs.manual = 1, 1
+    fs.manual_pages.append(2)
+    stats = JobStats()
+    stats.files.append(fs)
+    zip_path = str(tmp_path / "a.zip")
+    make_zip(str(tmp_path / "arquivos_processados"), zip_path)
+    JOBS["renomear"] = {"out": str(tmp_path), "stats": stats, "status": "finished", "artifacts": {"a.zip": zip_path}}
+    yield JOBS["renomear"]
+    JOBS.pop("renomear", None)
+
+def test_rename_outputs_moves_files_and_repacks_the_zip(job, tmp_path):
+    root = tmp_path / "arquivos_processados" / "a"
+    done = rename_outputs("renomear", [{"file": "a", "page": 2, "name": "FULANO"}])
+    assert done == [{"file": "a", "page": 2, "from": "MANUAL_a_2.pdf", "to": "FULANO_1.pdf"}]
+    assert sorted(os.listdir(root)) == ["FULANO.pdf", "FULANO_1.pdf"]
+    fs = job["stats"].files[0]
+    assert (fs.outputs, list(fs.manual_pages), fs.manual, fs.renamed) == (["FULANO.pdf", "FULANO_1.pdf"], [], 0, 2)
+    assert zip_contents(tmp_path / "a.zip") == {
+        "a/FULANO.pdf": b"FULANO.pdf" * 100, "a/FULANO_1.pdf": b"MANUAL_a_2.pdf" * 100,
+    }
+
+def test_rename_outputs_swaps_names_in_one_batch(job, tmp_path):
+    rename_outputs("renomear", [{"file": "a", "page": 1, "name": "CICLANO"}, {"file": "a", "page": 2, "name": "FULANO"}])
+    root = tmp_path / "arquivos_processados" / "a"
+    assert (root / "FULANO.pdf").read_bytes() == b"MANUAL_a_2.pdf" * 100
+    assert (root / "CICLANO.pdf").read_bytes() == b"FULANO.pdf" * 100
+
+def test_rename_outputs_rejects_bad_changes_untouched(job, tmp_path):
+    before = sorted(os.listdir(tmp_path / "arquivos_processados" / "a"))
+    for change in ({"file": "a", "page": 3, "name": "X"}, {"file": "b", "page": 1, "name": "X"}, {"file": "a", "page": 1, "name": " "}):
+        with pytest.raises(ValueError):
+            rename_outputs("renomear", [{"file": "a", "page": 1, "name": "OK"}, change])
+    assert sorted(os.listdir(tmp_path / "arquivos_processados" / "a")) == before
+    assert job["stats"].files[0].outputs == ["FULANO.pdf", "MANUAL_a_2.pdf"]
+
+def test_rename_outputs_rolls_back_when_the_zip_swap_fails(job, tmp_path, monkeypatch):
+    root = tmp_path / "arquivos_processados" / "a"
+    zip_before = (tmp_path / "a.zip").read_bytes()
+    real_replace = os.replace
+
+    def replace(src, dst):
+        if str(dst).endswith(".zip"):
+            raise OSError("disco cheio")
+        real_replace(src, dst)
+    monkeypatch.setattr(core.os, "replace", replace)
+    with pytest.raises(OSError, match="disco cheio"):
+        rename_outputs("renomear", [{"file": "a", "page": 2, "name": "CICLANO"}])
+    monkeypatch.undo()
+
+    assert sorted(os.listdir(root)) == ["FULANO.pdf", "MANUAL_a_2.pdf"]
+    assert (root / "MANUAL_a_2.pdf").read_bytes() == b"MANUAL_a_2.pdf" * 100
+    fs = job["stats"].files[0]
+    assert (fs.outputs, list(fs.manual_pages), fs.manual, fs.renamed) == (["FULANO.pdf", "MANUAL_a_2.pdf"], [2], 1, 1)
+    assert (tmp_path / "a.zip").read_bytes() == zip_before
+    assert not (tmp_path / "a.zip.part").exists()
@@ -0,0 +1,33 @@
+import threading, time
+from scheduler import FairScheduler
+
+def test_turn_cost_is_charged_to_the_quota():
+    sched = FairScheduler(2, quotas={"rh": 60})
+    turns = sched.turns("rh")
+    assert turns.turn(cost=16)
+    client = sched._clients["rh"]
+    assert client.pages == 16
+    assert 43.9 < client.tokens <= 44.1
+    turns.close()
+    assert sched.busy == 0
+
+def test_chunk_larger_than_the_quota_needs_a_full_bucket_and_leaves_debt():
+    sched = FairScheduler(2, quotas={"rh": 10})
+    turns = sched.turns("rh")
+    assert turns.turn(cost=25)  # balde cheio: entra mesmo custando mais que a cota
+    assert sched._clients["rh"].tokens < -14
+    cancel = threading.Event()
+    threading.Timer(0.3, cancel.set).start()
+    t0 = time.monotonic()
+    assert not turns.turn(cancel.is_set)  # dívida: a próxima vez espera recarregar
+    assert time.monotonic() - t0 >= 0.25
+    turns.close()
+
+def test_cost_ignored_without_quota():
+    sched = FairScheduler(1)
+    turns = sched.turns("ti")
+    for _ in range(3):
+        assert turns.turn(cost=16)
+    assert sched._clients["ti"].pages == 48
+    turns.close()
+    assert sched.busy == 0
@@ -0,0 +1,165 @@
+# thumbs.py
+"""Miniaturas das páginas MANUAL para renomear pela interface.
+
+Renderiza o cabeçalho (ou a página inteira) em DPI baixo com
+``Page.get_pixmap`` num pool de processos próprio e pequeno — a gravação e a
+prévia no pool do core não atrasam a tela — e grava o PNG num cache em disco
+com teto de tamanho (LRU pelo último acesso). Assim que um job termina (ou o
+plano fica pronto), as páginas manuais entram numa fila de prefetch limitada,
+que só ocupa o pool com até THUMB_WORKERS renderizações por vez: o pedido da
+tela entra direto e espera no máximo uma rodada. Quando a tela pede a
+miniatura, ela normalmente já está no disco; se não ficar pronta em
+THUMB_TIMEOUT segundos, o pedido desiste (o servidor responde 503).
+
+Configuração:
+  THUMB_DPI=48          resolução da miniatura
+  THUMB_CACHE_MB=64     teto do cache em disco
+  THUMB_WORKERS=1       processos de renderização
+  THUMB_PREFETCH=256    páginas na fila de prefetch (as mais antigas saem)
+  THUMB_TIMEOUT=10      espera máxima de um pedido, em segundos
+"""
+import os, hashlib, threading
+from collections import OrderedDict, deque
+
+THUMB_DPI = int(os.environ.get("THUMB_DPI", "48"))
+THUMB_CACHE_MB = float(os.environ.get("THUMB_CACHE_MB", "64"))
+THUMB_WORKERS = max(1, int(os.environ.get("THUMB_WORKERS", "1")))
+THUMB_PREFETCH = int(os.environ.get("THUMB_PREFETCH", "256"))
+THUMB_TIMEOUT = float(os.environ.get("THUMB_TIMEOUT", "10"))
+THUMB_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "thumbs")
+HEADER_FRACTION = 0.3  # sem layout conhecido: mesmo recorte do OCR
+
+_lock = threading.RLock()  # reentrante: o callback pode rodar dentro de _submit
+_index: "OrderedDict[str, int] | None" = None  # caminho → bytes, do menos para o mais recente
+_total = 0
+_pending: dict = {}  # chave → Future em renderização
+_backlog: deque = deque(maxlen=THUMB_PREFETCH)  # (pdf, página, fração) esperando vez no pool
+_prefetching = 0  # renderizações de prefetch no pool
+_pool = None
+
+def _get_pool():
+    # Chamado com o lock
+    global _pool
+    if _pool is None:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        _pool = ProcessPoolExecutor(max_workers=THUMB_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+def shutdown():
+    """Descarta o prefetch e espera os workers saírem (fim do servidor)."""
+    global _pool
+    with _lock:
+        _backlog.clear()
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+def _load_index():
+    # Chamado com o lock: reconstrói o LRU a partir do disco (ordem de mtime)
+    global _index, _total
+    if _index is not None:
+        return
+    os.makedirs(THUMB_DIR, exist_ok=True)
+    found = []
+    for name in os.listdir(THUMB_DIR):
+        path = os.path.join(THUMB_DIR, name)
+        if name.endswith(".png"):
+            st = os.stat(path)
+            found.append((st.st_mtime, path, st.st_size))
+    _index = OrderedDict((path, size) for _, path, size in sorted(found))
+    _total = sum(_index.values())
+
+def _evict():
+    # Chamado com o lock
+    global _total
+    limit = THUMB_CACHE_MB * 1024 * 1024
+    while _index and _total > limit:
+        path, size = _index.popitem(last=False)
+        _total -= size
+        try: os.remove(path)
+        except OSError: pass
+
+def _render(src_pdf: str, page_index: int, fraction: float | None, dpi: int) -> bytes:
+    # Executa no processo worker
+    import fitz
+    with fitz.open(src_pdf) as doc:
+        page = doc.load_page(page_index)
+        clip = None
+        if fraction:
+            r = page.rect
+            clip = fitz.Rect(r.x0, r.y0, r.x1, r.y0 + r.height * fraction)
+        return page.get_pixmap(dpi=dpi, clip=clip, colorspace=fitz.csGRAY).tobytes("png")
+
+def _key(src_pdf: str, page_index: int, fraction: float | None) -> str:
+    st = os.stat(src_pdf)
+    raw = f"{os.path.abspath(src_pdf)}|{st.st_size}|{st.st_mtime_ns}|{page_index}|{fraction}|{THUMB_DPI}"
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+def _store(path: str, png: bytes):
+    global _total
+    tmp = f"{path}.{threading.get_ident()}.part"  # callback e pedido podem gravar ao mesmo tempo
+    with open(tmp, "wb") as f: f.write(png)
+    os.replace(tmp, path)
+    with _lock:
+        _load_index()
+        _total += len(png) - _index.pop(path, 0)
+        _index[path] = len(png)
+        _evict()
+
+def _submit(src_pdf: str, page_index: int, fraction: float | None, background: bool = False):
+    """(caminho, Future ou None se já está no disco). ``background`` conta a
+    renderização no limite do prefetch."""
+    global _prefetching
+    key = _key(src_pdf, page_index, fraction)
+    path = os.path.join(THUMB_DIR, key + ".png")
+    with _lock:
+        _load_index()
+        if path in _index and os.path.isfile(path):
+            _index.move_to_end(path)
+            return path, None
+        fut = _pending.get(key)
+        if fut is None:
+            fut = _pending[key] = _get_pool().submit(_render, src_pdf, page_index, fraction, THUMB_DPI)
+            if background: _prefetching += 1
+
+            def done(f, key=key, path=path):
+                global _prefetching
+                try:
+                    if not f.cancelled() and f.exception() is None:
+                        _store(path, f.result())
+                finally:
+                    with _lock:
+                        _pending.pop(key, None)
+                        if background: _prefetching -= 1
+                        _pump()
+            fut.add_done_callback(done)
+    return path, fut
+
+def _pump():
+    # Chamado com o lock: põe prefetch no pool enquanto houver vaga de fundo
+    while _backlog and _prefetching < THUMB_WORKERS:
+        src_pdf, page_index, fraction = _backlog.popleft()
+        try:
+            _submit(src_pdf, page_index, fraction, background=True)
+        except Exception:
+            pass  # PDF sumiu: erros ficam para o pedido real
+
+def thumbnail(src_pdf: str, page_index: int, fraction: float | None = HEADER_FRACTION, timeout: float = THUMB_TIMEOUT) -> str:
+    """Caminho do PNG em cache, renderizando se preciso; TimeoutError se não ficar
+    pronto em ``timeout`` segundos (a renderização continua e fica no cache)."""
+    path, fut = _submit(src_pdf, page_index, fraction)
+    if fut is not None:
+        fut.result(timeout=timeout)
+        if not os.path.isfile(path):
+            # Callback ainda gravando: grava aqui mesmo (mesmo conteúdo, rename atômico)
+            _store(path, fut.result())
+    try: os.utime(path)
+    except OSError: pass
+    return path
+
+def prefetch(items):
+    """Enfileira (pdf, página 0-based, fração) sem esperar; erros ficam para o pedido real."""
+    with _lock:
+        _backlog.extend(items)
+        _pump()
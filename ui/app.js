@@ -0,0 +1,776 @@
+const $ = (s) => document.querySelector(s);
+// CORREÇÃO: Garante que todas as variáveis do modal de progresso sejam declaradas
+const fileInput = $("#file"), dropZone = $("#drop"), fileHint = $("#fileHint"), selectionBox = $("#selectionBox");
+const btnClear = $("#btnClear"), btnGo = $("#btnGo"), btnPlan = $("#btnPlan"), btnEscolher = $("#btnEscolher");
+const selectionTitle = $("#selectionTitle"), cardGroupsContainer = $("#cardGroupsContainer"), actionsContainer = $("#actionsContainer");
+// Compressão é sempre obrigatória
+const historyBox = $("#historyBox"), historyLinks = $("#historyLinks");
+const modal = $("#modal"), modalBackdrop = $("#modalBackdrop"), modalClose = $("#modalClose"), modalTitle = $("#modalTitle"), modalFrame = $("#modalFrame");
+const progressModal = $("#progressModal"), progressTitle = $("#progressTitle"), perFileProgressContainer = $("#perFileProgressContainer"), summaryContainer = $("#summaryContainer"), logDetails = $("#logDetails"), logContainer = $("#logContainer"), resultContainer = $("#resultContainer"), statusPulse = $("#statusPulse");
+const detailsModal = document.getElementById('detailsModal');
+const detailsModalClose = document.getElementById('detailsModalClose');
+const detailsFiles = document.getElementById('detailsFiles');
+const detailsLogs = document.getElementById('detailsLogs');
+const clearLogsBtn = document.getElementById('clearLogs');
+const immersiveProgress = document.getElementById('immersiveProgress');
+const circleRing = document.getElementById('circleRing');
+const circlePercent = document.getElementById('circlePercent');
+const pagesDoneEl = document.getElementById('pagesDone');
+const pagesTotalEl = document.getElementById('pagesTotal');
+const filesCountEl = document.getElementById('filesCount');
+const timeElapsedEl = document.getElementById('timeElapsed');
+const etaEl = document.getElementById('eta');
+const packagingOverlay = document.getElementById('packagingOverlay');
+let packagingShown = false;
+let pickedFiles = [], activeModalUrl = null, filesProgress = {}, currentJobId = null, jobCancelled = false, cancelJobBtn = null;
+
+const bytesToSize = b => b < 1024 ? b + " B" : (b < 1048576 ? (b / 1024).toFixed(1) + " KB" : (b / 1048576).toFixed(1) + " MB");
+
+function updateSelectionUI() {
+    const count = pickedFiles.length;
+    selectionTitle.innerHTML = `Selecionados <span class="text-slate-500 font-normal">(${count})</span>`;
+    selectionBox.classList.toggle('hidden', count === 0);
+    if (count === 0) {
+        fileHint.classList.remove('hidden');
+        actionsContainer.style.maxHeight = null;
+        actionsContainer.style.opacity = 0;
+        actionsContainer.style.paddingTop = 0;
+        actionsContainer.style.borderTopWidth = 0;
+    } else {
+        fileHint.classList.add('hidden');
+        actionsContainer.style.maxHeight = "500px"; 
+        actionsContainer.style.opacity = 1;
+        actionsContainer.style.paddingTop = "1.5rem";
+        actionsContainer.style.borderTopWidth = "1px";
+    }
+}
+
+function clearSelection() { 
+    cardGroupsContainer.innerHTML = ""; 
+    pickedFiles = []; 
+    fileInput.value = ""; 
+    updateSelectionUI(); 
+}
+
+
+function openDetailsModal(summary){
+    if(!detailsModal) return;
+    detailsFiles.innerHTML='';
+    (summary?.files||[]).forEach(f=>{
+        const el = document.createElement('div');
+        el.className='flex items-center justify-between gap-2 p-2 rounded border border-slate-200 bg-white hover:bg-slate-50';
+        el.innerHTML=`<span class='truncate font-medium text-slate-700' title='${f.file}.pdf'>${f.file}</span>
+                       <span class='text-[10px] text-slate-500'>${f.pages} pág · <span class='text-sky-600'>${f.renamed}</span> ren</span>`;
+        detailsFiles.appendChild(el);
+    });
+    detailsLogs.textContent = logContainer.innerText || '';
+    detailsModal.classList.remove('hidden');
+}
+
+detailsModalClose?.addEventListener('click', ()=>{ detailsModal.classList.add('hidden'); });
+clearLogsBtn?.addEventListener('click', ()=>{ detailsLogs.textContent=''; });
+
+// Ajuste responsivo do modal de progresso
+function adjustProgressModal(){
+    const modalEl = progressModal;
+    if(modalEl.classList.contains('hidden')) return; // só ajusta quando visível
+    const header = progressModal.querySelector('div > div > .flex.items-center.justify-between');
+    const circleWrapper = document.getElementById('immersiveProgress');
+    const summary = summaryContainer;
+    const logBox = logContainer.parentElement; // details
+    const resultBox = resultContainer;
+    const available = progressModal.clientHeight - 40; // padding margem
+    let used = 0;
+    [header, circleWrapper, summary, logBox, resultBox].forEach(el=>{ if(el && !el.classList.contains('hidden')) used += el.offsetHeight; });
+    // área de listas de arquivos
+    const list = perFileProgressContainer;
+    const extra = 80; // margem de segurança
+    const target = available - (used + extra);
+    if(target > 120){
+        list.style.maxHeight = target + 'px';
+    } else {
+        list.style.maxHeight = '200px';
+    }
+}
+
+window.addEventListener('resize', ()=>{
+    requestAnimationFrame(adjustProgressModal);
+});
+
+// Observer para quando summary abre ou logs mudam
+const progressMutationObserver = new MutationObserver(()=>{
+    requestAnimationFrame(adjustProgressModal);
+});
+progressMutationObserver.observe(document.documentElement,{subtree:true, attributes:true, attributeFilter:['class','open']});
+
+function toggleModal(modalElement, show) {
+  if (show) {
+    modalBackdrop.classList.remove('hidden');
+    modalBackdrop.style.pointerEvents = 'auto';
+    modalElement.classList.remove('hidden');
+    setTimeout(() => {
+      modalBackdrop.classList.remove('opacity-0');
+      modalElement.classList.remove('hidden-animated');
+      modalElement.classList.add('visible-animated');
+    }, 10);
+    try { history.pushState({ modal: modalElement.id }, '', location.href); } catch(e){}
+  } else {
+    modalBackdrop.classList.add('opacity-0');
+    modalElement.classList.remove('visible-animated');
+    modalElement.classList.add('hidden-animated');
+    setTimeout(() => {
+      modalElement.classList.add('hidden');
+      const allClosed = modal.classList.contains('hidden') && progressModal.classList.contains('hidden');
+      if (allClosed) {
+        modalBackdrop.classList.add('hidden');
+        modalBackdrop.style.pointerEvents = 'none';
+      }
+    }, 300);
+  }
+}
+
+window.addEventListener('popstate', () => {
+  // Fecha qualquer modal aberto e limpa backdrop
+  if (!modal.classList.contains('hidden')) {
+    toggleModal(modal, false);
+    // limpa iframe/URL blob
+    if (activeModalUrl) { URL.revokeObjectURL(activeModalUrl); activeModalUrl = null; }
+    modalFrame.src = 'about:blank';
+  }
+  if (!progressModal.classList.contains('hidden')) {
+    toggleModal(progressModal, false);
+  }
+  // Garante que o backdrop não fique “travando” os cliques
+  modalBackdrop.classList.add('hidden');
+  modalBackdrop.style.pointerEvents = 'none';
+});
+
+
+function openModal(file) { 
+    activeModalUrl = URL.createObjectURL(file); 
+    modalTitle.textContent = file.name; 
+    modalFrame.src = activeModalUrl; 
+    toggleModal(modal, true);
+}
+
+function closeModal() { 
+    if (activeModalUrl) { URL.revokeObjectURL(activeModalUrl); activeModalUrl = null; } 
+    modalFrame.src = 'about:blank'; 
+    toggleModal(modal, false);
+}
+
+const getFileGroup = (filename) => {
+    const name = filename.replace(/[\d\W_]+/g, ' ').trim().split(' ')[0];
+    return name.charAt(0).toUpperCase() + name.slice(1).toLowerCase() || "Outros";
+}
+
+function renderCards() {
+    cardGroupsContainer.innerHTML = '';
+    const groups = pickedFiles.reduce((acc, file) => {
+        const groupName = getFileGroup(file.name);
+        if (!acc[groupName]) acc[groupName] = [];
+        acc[groupName].push(file);
+        return acc;
+    }, {});
+
+    Object.keys(groups).sort().forEach(groupName => {
+        const groupWrapper = document.createElement('div');
+        groupWrapper.className = 'space-y-3 not-last:border-b not-last:pb-4';
+        
+        groupWrapper.innerHTML = `
+            <div class="flex items-center justify-between">
+                <span class="font-semibold text-slate-700">${groupName} <span class="text-slate-500 font-normal">(${groups[groupName].length})</span></span>
+            </div>
+            <div class="grid gap-4 [grid-template-columns:repeat(auto-fill,minmax(240px,1fr))]"></div>`;
+        const cardsGrid = groupWrapper.querySelector('.grid');
+        
+        groups[groupName].forEach(file => {
+            let displayName = file.name;
+            const codeMatch = file.name.match(/(\d{3,})/);
+            if (codeMatch) {
+                const extension = file.name.split('.').pop();
+                displayName = `${codeMatch[0]}.${extension}`;
+            }
+
+            const card = document.createElement("div");
+            card.className = "rounded-xl border bg-slate-100/80 p-3 flex items-center justify-between gap-3 card-animate-in";
+            card.innerHTML = `
+                <div class="flex items-center gap-3 min-w-0">
+                    <span class="flex-shrink-0 inline-flex items-center justify-center w-8 h-8 rounded-lg bg-red-600 text-white font-semibold text-sm">PDF</span>
+                    <div class="min-w-0">
+                        <div class="font-medium text-slate-800 truncate" title="${file.name}">${displayName}</div>
+                        <div class="text-xs text-slate-500">${bytesToSize(file.size)}</div>
+                    </div>
+                </div>
+                <div class="flex-shrink-0 flex items-center gap-1">
+                    <button data-preview title="Visualizar" class="p-2 rounded-lg hover:bg-slate-200 text-slate-600"><svg class="w-5 h-5" viewBox="0 0 24 24" fill="currentColor"><path d="M12 4.5C7 4.5 2.73 7.61 1 12c1.73 4.39 6 7.5 11 7.5s9.27-3.11 11-7.5c-1.73-4.39-6-7.5-11-7.5zM12 17c-2.76 0-5-2.24-5-5s2.24-5 5-5 5 2.24 5 5-2.24 5-5 5zm0-8c-1.66 0-3 1.34-3 3s1.34 3 3 3 3-1.34 3-3-1.34-3-3-3z"/></svg></button>
+                    <button data-remove title="Remover" class="p-2 rounded-lg hover:bg-red-100 text-red-600"><svg class="w-5 h-5" viewBox="0 0 24 24" fill="currentColor"><path d="M7 11v2h10v-2H7zm5-9C6.48 2 2 6.48 2 12s4.48 10 10 10 10-4.48 10-10S17.52 2 12 2zm0 18c-4.41 0-8-3.59-8-8s3.59-8 8-8 8 3.59 8 8-3.59 8-8 8z"/></svg></button>
+                </div>`;
+            card.querySelector("[data-preview]").onclick = () => openModal(file);
+            card.querySelector("[data-remove]").onclick = () => { 
+                card.style.transition = 'opacity 0.3s ease, transform 0.3s ease';
+                card.style.opacity = 0;
+                card.style.transform = 'scale(0.9)';
+                setTimeout(() => { const idx = pickedFiles.indexOf(file); if (idx > -1) { pickedFiles.splice(idx, 1); } renderCards(); updateSelectionUI(); }, 300);
+            };
+            cardsGrid.appendChild(card);
+        });
+        cardGroupsContainer.appendChild(groupWrapper);
+    });
+}
+
+function handleFileSelection(fileList) {
+    const incoming = Array.from(fileList).filter(f => f.name.toLowerCase().endsWith('.pdf'));
+    if(incoming.length === 0){
+        if(pickedFiles.length===0){ fileHint.textContent = "⚠️ Nenhum arquivo PDF válido foi selecionado."; }
+        updateSelectionUI();
+        return;
+    }
+    // mapa de existentes para evitar duplicados (usa trio nome+size+lastModified)
+    const existingSet = new Set(pickedFiles.map(f=>`${f.name}__${f.size}__${f.lastModified}`));
+    let added = 0;
+    incoming.forEach(f=>{
+        const key = `${f.name}__${f.size}__${f.lastModified}`;
+        if(!existingSet.has(key)){
+            pickedFiles.push(f);
+            existingSet.add(key);
+            added++;
+        }
+    });
+    if(pickedFiles.length === 0){
+        fileHint.textContent = "⚠️ Nenhum arquivo PDF válido foi selecionado.";
+    }
+    renderCards();
+    updateSelectionUI();
+}
+
+// Event Listeners
+["dragenter", "dragover"].forEach(ev=> { dropZone.addEventListener(ev, e=>{ e.preventDefault(); dropZone.classList.add("bg-sky-100"); }); });
+["dragleave", "drop"].forEach(ev=> { dropZone.addEventListener(ev, e=>{ e.preventDefault(); dropZone.classList.remove("bg-sky-100"); }); });
+dropZone.addEventListener("drop", e => { if (e.dataTransfer?.files?.length) handleFileSelection(e.dataTransfer.files); });
+btnEscolher.addEventListener("click", () => { fileInput.click(); });
+fileInput.addEventListener("change", () => { if (fileInput.files.length > 0) handleFileSelection(fileInput.files); });
+btnClear.onclick = clearSelection;
+btnGo.onclick = () => { if (pickedFiles.length === 0) { return; } runJob(pickedFiles, false); };
+// Modo plano: nomes de todas as páginas primeiro (só camada de texto), revisão, depois gravação
+btnPlan.onclick = () => { if (pickedFiles.length === 0) { return; } runJob(pickedFiles, false, "plan"); };
+modalClose.onclick = () => toggleModal(modal, false);
+// Sem botão fechar durante processamento
+modalBackdrop.onclick = () => {
+    toggleModal(modal, false);
+    toggleModal(progressModal, false);
+};
+
+// Item do histórico (job recém-concluído ou vindo de /api/history)
+function historyItemEl(url, filename, when) {
+    const historyItem = document.createElement('li');
+    historyItem.className = 'bg-white border border-slate-200 rounded-xl p-3 flex items-center justify-between gap-3 shadow-sm card-animate-in';
+    historyItem.innerHTML = `
+        <div class="flex items-center gap-3 min-w-0">
+            <div class="flex-shrink-0 w-10 h-10 flex items-center justify-center bg-sky-100 text-sky-600 rounded-lg">
+                <svg class="w-6 h-6" viewBox="0 0 24 24" fill="currentColor"><path fill-rule="evenodd" d="M2.25 1.5A2.25 2.25 0 000 3.75v16.5A2.25 2.25 0 002.25 22.5h19.5A2.25 2.25 0 0024 20.25V7.5a2.25 2.25 0 00-2.25-2.25h-9a.75.75 0 01-.53-.22L9.22 2.47a2.25 2.25 0 00-1.59-.64H2.25zm.36 18.06a.75.75 0 00.75-.75V3.75h4.19c.47 0 .93.19 1.25.53l2.25 2.25c.32.32.78.53 1.25.53h9.01v12.75a.75.75 0 01-.75.75H2.61z" clip-rule="evenodd" /></svg>
+            </div>
+            <div class="min-w-0">
+                <p class="font-semibold text-slate-800 truncate" title="${filename}">${filename}</p>
+                <p class="text-xs text-slate-500">${when}</p>
+            </div>
+        </div>
+        <a href="${url}" download="${filename}" title="Baixar ${filename}" class="flex-shrink-0 inline-flex items-center justify-center w-9 h-9 rounded-lg bg-slate-100 text-slate-600 hover:bg-slate-200 hover:text-slate-800 transition-colors">
+            <svg class="w-5 h-5" viewBox="0 0 24 24" fill="currentColor"><path d="M12 16.5a.75.75 0 01-.53-.22l-4.5-4.5a.75.75 0 011.06-1.06L11.25 14.19V5.25a.75.75 0 011.5 0v8.94l3.22-3.22a.75.75 0 111.06 1.06l-4.5 4.5a.75.75 0 01-.53.22zm-7.5 1.5A2.25 2.25 0 006.75 20.25h10.5a2.25 2.25 0 002.25-2.25a.75.75 0 011.5 0A3.75 3.75 0 0117.25 21.75H6.75A3.75 3.75 0 013 18a.75.75 0 011.5 0z"/></svg>
+        </a>
+    `;
+    return historyItem;
+}
+
+// Histórico persistido no servidor (SQLite): sobrevive a recarregar a página e a restarts
+async function loadHistory() {
+    try {
+        const res = await fetch('/api/history?limit=12');
+        if (!res.ok) return;
+        const data = await res.json();
+        for (const job of data.items) {
+            for (const filename of Object.keys(job.artifacts || {})) {
+                const url = `/api/jobs/${job.id}/artifacts/${encodeURIComponent(filename)}`;
+                const when = `Concluído em ${new Date(job.finished * 1000).toLocaleString('pt-BR')} · ${job.pages} pág.`;
+                historyLinks.appendChild(historyItemEl(url, filename, when));
+            }
+        }
+        if (historyLinks.children.length) historyBox.classList.remove('hidden');
+    } catch (e) {}
+}
+loadHistory();
+
+async function runJob(files, metricOnly, mode) {
+    perFileProgressContainer.innerHTML = "";
+    summaryContainer.innerHTML = "";
+    summaryContainer.classList.add("hidden");
+    logDetails.open = false;
+    logDetails.querySelector('summary').innerHTML = "Ver logs detalhados";
+    logDetails.style.display = 'none';
+    progressTitle.textContent = metricOnly ? "Testando Desempenho..." : (mode === "plan" ? "Lendo nomes..." : "Processando Arquivos...");
+    filesProgress = {};
+    toggleModal(progressModal, true);
+    immersiveProgress.classList.add('hidden');
+    circlePercent.textContent = '0%';
+    circleRing.style.background = 'conic-gradient(#0284c7 0deg,#e2e8f0 0deg)';
+    pagesDoneEl.textContent = '0';
+    pagesTotalEl.textContent = '0';
+    filesCountEl.textContent = '0';
+    timeElapsedEl.textContent = '00:00';
+    let globalTotalPages = 0; let globalDonePages = 0; let t0 = performance.now();
+    let tickInterval = null;
+    let lastPercentVal = -1;
+    function updateVisual(){
+        const now = performance.now();
+        const elapsed = (now - t0)/1000;
+        const mm = Math.floor(elapsed/60).toString().padStart(2,'0');
+        const ss = Math.floor(elapsed%60).toString().padStart(2,'0');
+        timeElapsedEl.textContent = `${mm}:${ss}`;
+        const percent = globalTotalPages? Math.floor((globalDonePages/globalTotalPages)*100):0;
+        if(percent !== lastPercentVal){
+            circlePercent.textContent = percent + '%';
+            circlePercent.style.transform='scale(1.15)';
+            setTimeout(()=>{ circlePercent.style.transform='scale(1)'; },160);
+            lastPercentVal = percent;
+        }
+        const deg = (percent/100)*360;
+        circleRing.style.background = `conic-gradient(#0284c7 ${deg}deg,#e2e8f0 ${deg}deg)`;
+        // ETA simples
+        if(globalDonePages>0 && globalTotalPages>0){
+            const rate = globalDonePages/elapsed; // páginas por segundo
+            if(rate>0){
+                const remainingPages = globalTotalPages - globalDonePages;
+                const remainingSec = remainingPages / rate;
+                const rm = Math.floor(remainingSec/60).toString().padStart(2,'0');
+                const rs = Math.floor(remainingSec%60).toString().padStart(2,'0');
+                etaEl.textContent = `${rm}:${rs}`;
+            }
+        }
+        // mini stats (se mini-mode)
+    }
+
+    const modalRoot = document.getElementById('progressModal');
+    immersiveProgress.classList.add('hidden');
+    perFileProgressContainer.className = 'flex-grow overflow-y-auto scrollbar-thin text-xs grid gap-y-0.5 gap-x-4' ;
+    perFileProgressContainer.style.gridTemplateColumns = 'repeat(auto-fill,minmax(300px,1fr))';
+        files.forEach(file => {
+                const fileBasename = file.name.replace(/\.pdf$/i, '').replace(/[^A-Za-z0-9]+/g, '_');
+                const row = document.createElement('div');
+                row.id = `progress-${fileBasename}`;
+                row.className = 'fileRow flex items-center gap-2 py-1 px-1 pr-2 status-pending border-b border-slate-100 last:border-none';
+                row.innerHTML = `
+                    <span class="statusIcon flex-shrink-0 inline-flex items-center justify-center w-4 h-4 rounded-full bg-yellow-400 text-white text-[9px] font-bold">!</span>
+                    <span class="flex-grow font-medium text-slate-700 truncate" title="${file.name}">${file.name}</span>
+                    <span class="count font-mono text-slate-500 text-[11px] w-20 text-right">Aguardando...</span>`;
+                perFileProgressContainer.appendChild(row);
+        });
+
+    const fd = new FormData();
+    files.forEach(f => fd.append("files", f));
+    // Compressão é sempre obrigatória
+    fd.append("compress_mode", "true");
+    fd.append("metric_only", metricOnly ? "true" : "false");
+    fd.append("mode", mode || "direct");
+    fd.append("layout", $("#outputLayout").value);
+
+    let job_id = null;
+    try {
+        const res = await fetch("/api/process", { method: "POST", body: fd });
+        if(!res.ok){
+            let detail = '';
+            try { detail = await res.text(); } catch(e){}
+            summaryContainer.innerHTML = `<div class='p-4 rounded-lg bg-red-50 border border-red-200 text-sm text-red-700'>Erro ao iniciar processamento (HTTP ${res.status}).<br/><pre class='whitespace-pre-wrap text-xs mt-2'>${detail.replace(/[<>]/g,'')}</pre></div>`;
+            summaryContainer.classList.remove('hidden');
+            toggleModal(progressModal, true);
+            return;
+        }
+        const data = await res.json();
+    job_id = data.job_id;
+    currentJobId = job_id;
+    jobCancelled = false;
+    } catch(fetchErr){
+        summaryContainer.innerHTML = `<div class='p-4 rounded-lg bg-red-50 border border-red-200 text-sm text-red-700'>Falha na requisição /api/process.<br/><code>${(fetchErr&&fetchErr.message)||fetchErr}</code></div>`;
+        summaryContainer.classList.remove('hidden');
+        toggleModal(progressModal, true);
+        return;
+    }
+    // debug log removido (PEGA-BUG)
+    const ws = new WebSocket(`${location.protocol === "https:" ? "wss" : "ws"}://${location.host}/ws/${job_id}`);
+    // Botão cancelar no rodapé
+    resultContainer.innerHTML='';
+    cancelJobBtn = document.createElement('button');
+    cancelJobBtn.className='w-full inline-flex items-center justify-center gap-2 rounded-xl bg-red-600 hover:bg-red-700 text-white font-medium px-4 py-2 text-sm shadow';
+    cancelJobBtn.innerHTML='<svg class="w-5 h-5" viewBox="0 0 24 24" fill="currentColor"><path d="M12 2a10 10 0 1010 10A10.011 10.011 0 0012 2zm3.707 12.293a1 1 0 01-1.414 1.414L12 13.414l-2.293 2.293a1 1 0 01-1.414-1.414L10.586 12 8.293 9.707a1 1 0 011.414-1.414L12 10.586l2.293-2.293a1 1 0 011.414 1.414L13.414 12z"/></svg><span>Cancelar processamento</span>';
+    cancelJobBtn.onclick = async ()=>{
+        if(!currentJobId || jobCancelled) return;
+        jobCancelled = true;
+        cancelJobBtn.disabled = true;
+        cancelJobBtn.innerHTML = '<span class="animate-pulse">Cancelando...</span>';
+        cancelJobBtn.classList.add('opacity-80');
+        try { await fetch(`/api/cancel/${currentJobId}`, { method: 'POST' }); } catch(e){}
+    };
+    resultContainer.appendChild(cancelJobBtn);
+
+    ws.onmessage = async (ev) => {
+        const msg = JSON.parse(ev.data);
+    // Sanitização UNIFICADA: mesma regra usada na criação (colapsa blocos não alfanuméricos em underscore)
+    const sanitizedFile = msg.data.file ? msg.data.file.replace(/[^A-Za-z0-9]+/g, '_') : '';
+
+        switch (msg.event) {
+            case "init": {
+                const files = (msg.data && Array.isArray(msg.data.files)) ? msg.data.files : [];
+                globalTotalPages = 0; globalDonePages = 0;
+                if (files.length) {
+                    immersiveProgress.classList.remove('hidden');
+                    filesCountEl.textContent = files.length;
+                    t0 = performance.now();
+                    if (tickInterval) clearInterval(tickInterval);
+                    tickInterval = setInterval(()=>{ updateVisual(); }, 500);
+                }
+                files.forEach(f => {
+                    globalTotalPages += f.pages;
+                    const sid = f.id;
+                    let el = document.getElementById(`progress-${sid}`);
+                    if (!el) {
+                                                el = document.createElement('div');
+                                                el.id = `progress-${sid}`;
+                                                el.className = 'fileRow flex items-center gap-2 py-1.5 px-1 pr-2 status-processing';
+                                                el.innerHTML = `
+                                                    <span class="statusIcon flex-shrink-0 inline-flex items-center justify-center w-4 h-4 rounded-full bg-sky-500 text-white text-[9px]">⟳</span>
+                                                    <span class="flex-grow font-medium text-slate-700 truncate" title="${f.file}.pdf">${f.file}.pdf</span>
+                                                    <span class="count font-mono text-slate-500 text-[11px] w-20 text-right">0/${f.pages}</span>`;
+                                                perFileProgressContainer.appendChild(el);
+                    } else {
+                        const c = el.querySelector('.count');
+                        if (c) c.textContent = `0/${f.pages}`;
+                    }
+                    filesProgress[f.file] = { done: 0, total: f.pages };
+                });
+                break; }
+            case "file_start": {
+                const el = document.getElementById(`progress-${sanitizedFile}`);
+                if (el) {
+                    const c0 = el.querySelector('.count');
+                    if(c0) c0.textContent = `0/${msg.data.pages}`;
+                    el.classList.remove('status-pending');
+                    el.classList.add('status-processing');
+                    el.classList.add('bg-sky-50');
+                    const icon = el.querySelector('.statusIcon');
+                    if(icon){
+                        icon.innerHTML = '<svg class="w-4 h-4 text-sky-600 animate-spin" viewBox="0 0 24 24"><circle class="opacity-25" cx="12" cy="12" r="10" stroke="currentColor" stroke-width="4" fill="none"></circle><path class="opacity-75" fill="currentColor" d="M4 12a8 8 0 018-8v3a5 5 0 00-5 5H4z"/></svg>';
+                        icon.className = 'statusIcon flex-shrink-0 inline-flex items-center justify-center w-4 h-4';
+                    }
+                }
+                if (!filesProgress[msg.data.file]) {
+                    // Caso file_start venha antes de init (fallback)
+                    filesProgress[msg.data.file] = { done: 0, total: msg.data.pages };
+                    globalTotalPages += msg.data.pages;
+                    if (immersiveProgress.classList.contains('hidden')) {
+                        immersiveProgress.classList.remove('hidden');
+                        t0 = performance.now();
+                        if (tickInterval) clearInterval(tickInterval);
+                        tickInterval = setInterval(()=>{ updateVisual(); }, 500);
+                    }
+                }
+                break; }
+            case "page_done": {
+                const fp = filesProgress[msg.data.file];
+                if(!fp) return;
+                fp.done++;
+                globalDonePages++;
+                let el = document.getElementById(`progress-${sanitizedFile}`);
+                if(!el){
+                    // tentativa de fallback: procura elementos cujo id começa com progress- e contém a base simplificada
+                    const candidates = Array.from(perFileProgressContainer.querySelectorAll('[id^="progress-"]'));
+                    const simple = sanitizedFile.toLowerCase();
+                    el = candidates.find(c => c.id.toLowerCase() === `progress-${simple}`) ||
+                         candidates.find(c => c.id.toLowerCase().startsWith(`progress-${simple}`)) ||
+                         candidates.find(c => c.id.toLowerCase().includes(simple));
+                    if(el) console.log('[DEBUG-FALLBACK] Match alternativo para', sanitizedFile, '->', el.id);
+                }
+                if (el){
+                    const countEl = el.querySelector('.count');
+                    if(countEl){
+                        const prevW = countEl.offsetWidth; // largura fixa para não provocar reflow externo
+                        countEl.style.display='inline-block';
+                        countEl.style.width = prevW? prevW+'px':'auto';
+                        countEl.textContent = `${fp.done}/${fp.total}`;
+                        countEl.animate([
+                            { transform:'scale(1)', color:'#0369a1' },
+                            { transform:'scale(1.15)', color:'#0ea5e9' },
+                            { transform:'scale(1)', color:'#0369a1' }
+                        ], { duration:220, easing:'ease-out' });
+                        if(fp.done === fp.total){
+                            countEl.classList.add('text-emerald-600','font-semibold');
+                            countEl.animate([
+                                { transform:'scale(1)', color:'#059669' },
+                                { transform:'scale(1.22)', color:'#10b981' },
+                                { transform:'scale(1)', color:'#059669' }
+                            ], { duration:300, easing:'ease-out' });
+                        }
+                    }
+                    // completed?
+                    if(fp.done === fp.total){
+                        el.classList.remove('status-processing','bg-sky-50');
+                        el.classList.add('status-done','bg-emerald-50');
+                        const icon = el.querySelector('.statusIcon');
+                        if(icon){
+                            icon.textContent = '✓';
+                            icon.className = 'statusIcon flex-shrink-0 inline-flex items-center justify-center w-4 h-4 rounded-full bg-emerald-500 text-white text-[9px]';
+                        }
+                    }
+                }
+                pagesDoneEl.textContent = globalDonePages;
+                pagesTotalEl.textContent = globalTotalPages;
+                // registrar amostra para sparkline (últimos ~10s)
+                const nowT = (performance.now()-t0)/1000;
+                updateVisual();
+                // se todas as páginas concluídas mas ainda não veio finished, mostrar overlay
+                if(!packagingShown && globalDonePages === globalTotalPages && globalTotalPages>0){
+                    packagingShown = true;
+                    packagingOverlay?.classList.remove('hidden');
+                }
+                if (!metricOnly) {
+                    const logEntry = document.createElement('p');
+                    logEntry.className = "text-sm text-slate-600 border-b border-slate-200 pb-1 mb-1 font-mono";
+                    logEntry.innerHTML = `Pág. <b>${msg.data.page}</b> de <i>${msg.data.file}.pdf</i>  <span class="text-slate-400"> ➤ </span> <span class="font-medium text-emerald-700">${msg.data.newName}.pdf</span>`
+                        + (typeof msg.data.confidence === 'number' ? ` <span class="text-[11px] ${msg.data.confidence >= 0.9 ? 'text-slate-400' : 'text-amber-600'}">(${Math.round(msg.data.confidence*100)}%)</span>` : '');
+                    logContainer.appendChild(logEntry);
+                    logContainer.scrollTop = logContainer.scrollHeight;
+                }
+                break; }
+            case "plan": {
+                // Arquivo inteiro nomeado de uma vez: conta como progresso da leitura
+                const fp = filesProgress[msg.data.file];
+                const entries = msg.data.entries || [];
+                if (fp) { fp.done = entries.length; }
+                globalDonePages += entries.length;
+                const el = document.getElementById(`progress-${sanitizedFile}`);
+                const c = el && el.querySelector('.count');
+                if (c) c.textContent = `${entries.length}/${fp ? fp.total : entries.length}`;
+                pagesDoneEl.textContent = globalDonePages;
+                updateVisual();
+                const manual = entries.filter(e => e.manual).length;
+                const logEntry = document.createElement('p');
+                logEntry.className = "text-sm text-slate-600 border-b border-slate-200 pb-1 mb-1 font-mono";
+                logEntry.textContent = `${msg.data.file}.pdf: ${entries.length} pág. lidas, ${manual} sem nome`;
+                logContainer.appendChild(logEntry);
+                break; }
+            case "planned": {
+                if (tickInterval) { clearInterval(tickInterval); tickInterval = null; updateVisual(); }
+                progressTitle.textContent = "Revise os nomes";
+                const res = await fetch(`/api/jobs/${job_id}/plan`);
+                const plan = res.ok ? await res.json() : { files: [] };
+                // Tabela editável: manuais primeiro em destaque; só os campos alterados vão no PATCH
+                summaryContainer.innerHTML = '';
+                const table = document.createElement('div');
+                table.className = 'max-h-[40vh] overflow-y-auto scrollbar-thin rounded-lg border border-slate-200 bg-white text-xs';
+                const inputs = [];
+                plan.files.forEach(f => f.entries.forEach(e => {
+                    const row = document.createElement('label');
+                    row.className = `flex items-center gap-2 px-2 py-1 border-b border-slate-100 ${e.manual ? 'bg-amber-50' : ''}`;
+                    const where = document.createElement('span');
+                    where.className = 'w-40 truncate font-mono text-slate-500';
+                    where.textContent = `${f.file} · p${e.page}`;
+                    where.title = `Página ${e.page} de ${f.file}.pdf`;
+                    const input = document.createElement('input');
+                    input.className = 'flex-1 rounded-md border border-slate-300 px-2 py-1 font-mono text-xs';
+                    input.value = e.name;
+                    input.dataset.file = f.file; input.dataset.page = e.page; input.dataset.orig = e.name;
+                    row.append(where, input);
+                    if (e.manual) {
+                        // Miniatura do cabeçalho (já pré-renderizada no servidor) para saber de quem é a página
+                        const img = document.createElement('img');
+                        img.loading = 'lazy';
+                        img.className = 'h-10 rounded border border-slate-200';
+                        img.src = `/api/jobs/${job_id}/thumbs/${encodeURIComponent(f.file)}/${e.page}`;
+                        img.onclick = (ev) => { ev.preventDefault(); window.open(`${img.src}?region=page`, '_blank'); };
+                        row.insertBefore(img, input);
+                    }
+                    inputs.push(input);
+                    table.appendChild(row);
+                }));
+                summaryContainer.appendChild(table);
+                summaryContainer.classList.remove('hidden');
+                const goBtn = document.createElement('button');
+                goBtn.className = 'w-full inline-flex items-center justify-center gap-2 rounded-xl bg-orange-500 hover:bg-orange-600 text-white font-medium px-4 py-2 text-sm shadow mb-2';
+                goBtn.textContent = 'Gerar arquivos';
+                goBtn.onclick = async () => {
+                    goBtn.disabled = true;
+                    const changes = inputs.filter(i => i.value.trim() && i.value.trim() !== i.dataset.orig)
+                        .map(i => ({ file: i.dataset.file, page: Number(i.dataset.page), name: i.value.trim() }));
+                    if (changes.length) {
+                        const r = await fetch(`/api/jobs/${job_id}/plan`, { method: 'PATCH', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify({ changes }) });
+                        if (!r.ok) { goBtn.disabled = false; alert('Não foi possível salvar as correções.'); return; }
+                    }
+                    await fetch(`/api/jobs/${job_id}/execute`, { method: 'POST' });
+                    goBtn.remove();
+                    summaryContainer.classList.add('hidden');
+                    progressTitle.textContent = "Gerando Arquivos...";
+                    // Segunda passada: o progresso recomeça com as páginas gravadas
+                    globalDonePages = 0;
+                    Object.values(filesProgress).forEach(fp => { fp.done = 0; });
+                    t0 = performance.now();
+                    tickInterval = setInterval(()=>{ updateVisual(); }, 500);
+                };
+                resultContainer.prepend(goBtn);
+                break; }
+case "finished": {
+                if(packagingOverlay){ packagingOverlay.classList.add('hidden'); }
+                packagingShown = false;
+                // Parar timers
+                if (tickInterval) { clearInterval(tickInterval); tickInterval = null; }
+                // Capturar summary
+                const summary = msg.data.summary || {renamed:0, manual:0, files:[]};
+                const totalPagesGlobal = summary.files.reduce((a,f)=>a+f.pages,0);
+                // Limpar área visual anterior
+                const headerEl = document.getElementById('progressHeader');
+                if(headerEl) headerEl.classList.add('hidden');
+                immersiveProgress.classList.add('hidden');
+                summaryContainer.classList.add('hidden');
+                // Construir novo layout: uma linha global + linhas por arquivo
+                perFileProgressContainer.innerHTML = '';
+                perFileProgressContainer.className = 'flex-grow overflow-y-auto scrollbar-thin divide-y divide-slate-200 rounded-lg border border-slate-200 bg-white';
+                // Linha global
+                const globalLine = document.createElement('div');
+                globalLine.className='flex items-center gap-4 px-3 py-2 text-sm bg-sky-50 font-medium text-slate-700 sticky top-0';
+                globalLine.innerHTML = `<span class='flex-1'>Resumo Geral</span>
+                                <span class='w-48 text-right font-mono text-[12px]'><span class='text-sky-700 font-semibold'>${summary.renamed}</span>/<span class='${summary.manual>0?'text-amber-600 font-semibold':'text-slate-400'}'>${summary.manual}</span> · ${totalPagesGlobal} pág.</span>`;
+                perFileProgressContainer.appendChild(globalLine);
+                // Linhas de arquivos
+                (summary.files||[]).forEach(f=>{
+                    const line = document.createElement('div');
+                    line.className='flex items-center gap-4 px-3 py-1.5 text-[13px] hover:bg-slate-50';
+                    const statusClass = f.manual === 0 ? 'text-emerald-600' : (f.renamed>0 ? 'text-amber-600' : 'text-red-600');
+                    const statusLabel = f.manual === 0 ? '100% renomeado' : (f.renamed>0 ? 'Parcial' : 'Nenhuma página nomeada');
+                    line.innerHTML = `
+                                       <span class='w-4 h-4 flex items-center justify-center text-slate-400'>📄</span>
+                                       <span class='flex-1 truncate font-medium text-slate-700' title='${f.file}.pdf'>${f.file}.pdf</span>
+                                       <span class='w-40 text-right font-mono text-[11px] text-slate-600'><span class='text-sky-600 font-semibold'>${f.renamed}</span>/<span class='${f.manual>0?'text-amber-600 font-semibold':'text-slate-400'}'>${f.manual}</span> · ${f.pages} pág.</span>
+                                       <span class='w-32 text-right text-[11px] ${statusClass}'>${statusLabel}</span>`;
+                    perFileProgressContainer.appendChild(line);
+                });
+                // Ajustar altura
+                perFileProgressContainer.style.maxHeight='55vh';
+                progressTitle.textContent='';
+                // Botão download (auto + manual) e LÓGICA DE HISTÓRICO
+                resultContainer.innerHTML='';
+                historyBox.classList.remove("hidden");
+                let autoTriggered = false;
+                for (const url of msg.data.urls) {
+                    const filename = decodeURIComponent(url.split("/").pop());
+                    // Auto-download
+                    if(!autoTriggered){
+                        const a = document.createElement('a'); a.href = url; a.download = filename; a.style.display='none'; document.body.appendChild(a); a.click(); setTimeout(()=>a.remove(),800);
+                        autoTriggered = true;
+                    }
+                    // Botão de download no modal
+                    const dlBtn = document.createElement('a');
+                    dlBtn.className = 'inline-flex items-center justify-center gap-2 rounded-xl text-white px-4 py-2 text-base font-medium bg-emerald-600 hover:bg-emerald-700 w-full';
+                    dlBtn.href = url; dlBtn.innerHTML = `<svg class="w-6 h-6" viewBox="0 0 24 24" fill="currentColor"><path d="M12 15a1 1 0 01-.7-.29l-4-4a1 1 0 111.4-1.42L12 12.59l3.3-3.3a1 1 0 111.4 1.42l-4 4a1 1 0 01-.7.29zM12 3a9 9 0 109 9 9 9 0 00-9-9zm0 16a7 7 0 117-7 7 7 0 01-7 7z"/></svg><span>Baixar novamente ${filename}</span>`;
+                    resultContainer.appendChild(dlBtn);
+
+                    // ### INÍCIO DA CORREÇÃO DE HISTÓRICO ###
+                    const historyItem = historyItemEl(url, filename, `Concluído às ${new Date().toLocaleTimeString('pt-BR')}`);
+                    historyLinks.prepend(historyItem);
+                    // ### FIM DA CORREÇÃO DE HISTÓRICO ###
+                }
+                const closeBtn = document.createElement('button');
+                closeBtn.className='w-full inline-flex items-center justify-center gap-2 rounded-xl bg-slate-600 hover:bg-slate-700 text-white font-medium px-4 py-2 text-sm';
+                closeBtn.textContent='Fechar';
+                closeBtn.onclick=()=>toggleModal(progressModal,false);
+                resultContainer.appendChild(closeBtn);
+                ws.close();
+                clearSelection();
+                break; 
+            }
+            case "metric":
+                progressTitle.textContent = "Métrica de Desempenho";
+                if (tickInterval) { clearInterval(tickInterval); tickInterval = null; updateVisual(); }
+                const ramUsage = msg.data.ram;
+                const ramLimit = 512;
+                const ramColor = ramUsage > ramLimit ? 'text-red-600 font-bold' : 'text-emerald-600 font-bold';
+                const ramMessage = ramUsage > ramLimit ? `(Acima do limite de ${ramLimit}MB)` : `(Dentro do limite de ${ramLimit}MB)`;
+                summaryContainer.innerHTML = `<div class="p-4 bg-slate-100 rounded-lg text-center space-y-2"><p class="text-lg">Páginas Processadas: <span class="font-semibold">${msg.data.pages}</span></p><p class="text-lg">Tempo Total: <span class="font-semibold">${msg.data.time} segundos</span></p><div><p class="text-lg">Pico de RAM: <span class="${ramColor}">${ramUsage} MB</span></p><p class="text-sm text-slate-500">${ramMessage}</p></div></div>`;
+                summaryContainer.classList.remove("hidden");
+                logDetails.style.display = 'none';
+                const closeBtnMetric = document.createElement("button");
+                closeBtnMetric.className = "mt-4 w-full text-slate-600 hover:text-slate-900 py-2";
+                closeBtnMetric.textContent = "Fechar";
+                closeBtnMetric.onclick = () => toggleModal(progressModal, false);
+                resultContainer.appendChild(closeBtnMetric); 
+                ws.close();
+                break;
+            case "error":
+                if(packagingOverlay){ packagingOverlay.classList.add('hidden'); }
+                packagingShown = false;
+                progressTitle.textContent = "Erro no Processamento";
+                if (tickInterval) { clearInterval(tickInterval); tickInterval = null; updateVisual(); }
+                circleRing.style.background = 'conic-gradient(#dc2626 360deg,#e2e8f0 360deg)';
+                circlePercent.classList.add('text-red-600');
+                summaryContainer.innerHTML = `<p class="text-red-600 p-4 bg-red-50 rounded-lg">${msg.data.message}</p>`;
+                summaryContainer.classList.remove("hidden");
+                ws.close();
+                // Substitui por botão fechar
+                resultContainer.innerHTML='';
+                const closeErr = document.createElement('button');
+                closeErr.className='w-full inline-flex items-center justify-center gap-2 rounded-xl bg-slate-600 hover:bg-slate-700 text-white font-medium px-4 py-2 text-sm';
+                closeErr.textContent='Fechar';
+                closeErr.onclick=()=>toggleModal(progressModal,false);
+                resultContainer.appendChild(closeErr);
+                break;
+            case "hello":
+                // já recebido no início: pode conter total_pages
+                if (typeof msg.data.total_pages === 'number') {
+                    // Só mostra depois do primeiro file_start para evitar 0/0
+                }
+                break;
+            case "cancelled": {
+                if(packagingOverlay){ packagingOverlay.classList.add('hidden'); }
+                packagingShown = false;
+                if (tickInterval) { clearInterval(tickInterval); tickInterval = null; }
+                const summary = msg.data.summary || {renamed:0, manual:0, files:[]};
+                const totalPagesGlobal = summary.files.reduce((a,f)=>a+f.pages,0);
+                const headerEl = document.getElementById('progressHeader');
+                if(headerEl) headerEl.classList.add('hidden');
+                immersiveProgress.classList.add('hidden');
+                summaryContainer.classList.add('hidden');
+                perFileProgressContainer.innerHTML='';
+                perFileProgressContainer.className='flex-grow overflow-y-auto scrollbar-thin divide-y divide-slate-200 rounded-lg border border-slate-200 bg-white';
+                const globalLine = document.createElement('div');
+                globalLine.className='flex items-center gap-4 px-3 py-2 text-sm bg-amber-50 font-medium text-slate-700 sticky top-0';
+                globalLine.innerHTML = `<span class='flex-1'>Processamento Cancelado</span>
+                    <span class='w-48 text-right font-mono text-[12px]'><span class='text-sky-700 font-semibold'>${summary.renamed}</span>/<span class='${summary.manual>0?'text-amber-600 font-semibold':'text-slate-400'}'>${summary.manual}</span> · ${totalPagesGlobal} pág.</span>`;
+                perFileProgressContainer.appendChild(globalLine);
+                (summary.files||[]).forEach(f=>{
+                    const line = document.createElement('div');
+                    line.className='flex items-center gap-4 px-3 py-1.5 text-[13px] hover:bg-slate-50';
+                    const statusClass = f.manual === 0 ? 'text-emerald-600' : (f.renamed>0 ? 'text-amber-600' : 'text-red-600');
+                    const statusLabel = f.manual === 0 ? '100% renomeado' : (f.renamed>0 ? 'Parcial' : 'Nenhuma página nomeada');
+                    line.innerHTML = `
+                       <span class='w-4 h-4 flex items-center justify-center text-slate-400'>📄</span>
+                       <span class='flex-1 truncate font-medium text-slate-700' title='${f.file}.pdf'>${f.file}.pdf</span>
+                       <span class='w-40 text-right font-mono text-[11px] text-slate-600'><span class='text-sky-600 font-semibold'>${f.renamed}</span>/<span class='${f.manual>0?'text-amber-600 font-semibold':'text-slate-400'}'>${f.manual}</span> · ${f.pages} pág.</span>
+                       <span class='w-32 text-right text-[11px] ${statusClass}'>${statusLabel}</span>`;
+                    perFileProgressContainer.appendChild(line);
+                });
+                resultContainer.innerHTML='';
+                historyBox.classList.remove('hidden');
+                for (const url of msg.data.urls||[]) {
+                    const filename = decodeURIComponent(url.split("/").pop());
+                    const dlBtn = document.createElement('a');
+                    dlBtn.className = 'inline-flex items-center justify-center gap-2 rounded-xl text-white px-4 py-2 text-base font-medium bg-amber-600 hover:bg-amber-700 w-full';
+                    dlBtn.href = url; dlBtn.innerHTML = `<svg class="w-5 h-5" viewBox="0 0 24 24" fill="currentColor"><path d="M12 15a1 1 0 01-.7-.29l-4-4a1 1 0 111.4-1.42L12 12.59l3.3-3.3a1 1 0 111.4 1.42l-4 4a1 1 0 01-.7.29zM12 3a9 9 0 109 9 9 9 0 00-9-9zm0 16a7 7 0 117-7 7 7 0 01-7 7z"/></svg><span>Baixar parcial ${filename}</span>`;
+                    resultContainer.appendChild(dlBtn);
+                }
+                const closeBtn = document.createElement('button');
+                closeBtn.className='w-full inline-flex items-center justify-center gap-2 rounded-xl bg-slate-600 hover:bg-slate-700 text-white font-medium px-4 py-2 text-sm';
+                closeBtn.textContent='Fechar';
+                closeBtn.onclick=()=>toggleModal(progressModal,false);
+                resultContainer.appendChild(closeBtn);
+                ws.close();
+                clearSelection();
+                break; }
+        }
+    };
+}